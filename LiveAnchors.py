@@ -0,0 +1,95 @@
+"""
+LiveAnchors, the playheads of the playing clips as anchors from which
+clients extrapolate the position themselves.
+
+Instead of sending the playing position of every playing clip each time
+Live reports it, ClipAnchors sends
+
+    /live/clip/anchor (int track, int clip, float position, float length,
+                       float loop_start, float loop_end, int looping,
+                       float song_time, float tempo)
+
+only when a clip starts playing, loops, jumps to another position, its
+loop changes or the tempo changes.  LiveOSC calls update() for the
+playing clips once per tick.  Until the next anchor the playhead
+at the song time t is position + (t - song_time) beats, wrapped into
+loop_start - loop_end if looping is 1, and the song time advances by
+tempo beats per minute.
+
+Anchors are state updates: they are numbered and resent by /remix/resync
+like the other state updates.  If corrections are on, the anchor of
+each playing clip is also sent again every interval seconds to make up
+for drift and lost datagrams.
+"""
+
+import time
+
+class Anchor:
+    """The anchor last sent for a playing clip"""
+    def __init__(self, clip, position, songTime, loop, now):
+        self.clip = clip
+        self.position = position
+        self.songTime = songTime
+        self.loop = loop
+        self.last = position
+        self.sent = now
+
+class ClipAnchors:
+    """Sends the anchors of the playing clips of the song"""
+    def __init__(self, oscEndpoint, tolerance = 0.1, interval = 1.0):
+        self.oscEndpoint = oscEndpoint
+        # How many beats the playhead may differ from the anchor before
+        # it counts as a jump, and how often corrections are sent
+        self.tolerance = tolerance
+        self.interval = interval
+        # Anchors indexed by (track, clip)
+        self.anchors = {}
+
+    def update(self, tid, cid, clip, songTime, tempo):
+        """Checks the playhead and loop of (clip) in clip slot (cid) of track (tid) at the song time (songTime)
+        against its anchor and sends a new anchor if the clip started, looped, jumped or its loop changed."""
+        position = float(clip.playing_position)
+        songTime = float(songTime)
+        anchor = self.anchors.get((tid, cid))
+        if anchor != None and anchor.clip == clip and anchor.loop == self.loop(clip):
+            expected = anchor.position + songTime - anchor.songTime
+            if position >= anchor.last and abs(position - expected) <= self.tolerance:
+                anchor.last = position
+                return
+        self.send(tid, cid, clip, position, songTime, tempo)
+
+    def loop(self, clip):
+        return (float(clip.loop_start), float(clip.loop_end), int(clip.looping))
+
+    def send(self, tid, cid, clip, position, songTime, tempo, now = None):
+        if now == None:
+            now = time.time()
+        loop = self.loop(clip)
+        self.anchors[(tid, cid)] = Anchor(clip, position, songTime, loop, now)
+        self.oscEndpoint.sendCoalesced('/live/clip/anchor', (tid, cid, position, float(clip.length), loop[0], loop[1], loop[2],
+            songTime, float(tempo)), 2)
+
+    def stop(self, tid, cid):
+        """Forgets the anchor of clip slot (cid) of track (tid) after the clip stopped or was removed"""
+        if self.anchors.has_key((tid, cid)):
+            del self.anchors[(tid, cid)]
+        self.oscEndpoint.forgetState('/live/clip/anchor', (tid, cid))
+
+    def clear(self):
+        for key in self.anchors.keys():
+            self.stop(key[0], key[1])
+
+    def resend(self, song, corrections = 0):
+        """Sends the anchors of all playing clips again, or if (corrections) is true, those that
+        were last sent at least interval seconds ago"""
+        now = time.time()
+        songTime = float(song.current_song_time)
+        for key in self.anchors.keys():
+            anchor = self.anchors[key]
+            if corrections and now - anchor.sent < self.interval:
+                continue
+            # Clips that have been deleted from the song compare equal to None
+            if anchor.clip == None or not anchor.clip.is_playing:
+                self.stop(key[0], key[1])
+                continue
+            self.send(key[0], key[1], anchor.clip, float(anchor.clip.playing_position), songTime, song.tempo, now)
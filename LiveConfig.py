@@ -0,0 +1,82 @@
+"""
+LiveConfig, the feature gates that switch whole families of LiveOSC
+listeners on or off.
+
+    meters      the /live/meters frames and watches of meter_left and
+                meter_right
+    positions   the playing positions of the playing clips, polled once
+                per tick and sent as /live/clip/anchor, and watches of
+                playing_position
+    corrections the anchors of the playing clips sent again every second
+                to make up for drift, if positions are on
+    params      the watches of device parameters, and so the selection
+                of device parameter banks
+    names       the name and colour listeners of the tracks and clips,
+                which send /live/name/track, /live/name/clip and
+                /live/name/trackblock, and watches of names
+
+The listeners of a family that is switched off are not added at all,
+and what is polled is not read.
+The gates are read from LiveOSC.cfg in the directory of the script,
+with one "name = 0" or "name = 1" line per gate and comments starting
+with "#", and can be changed with /remix/config.  They replace the
+"LiveOSC Control.adg" device, whose parameters are no longer read.
+"""
+
+from Logger import log
+
+# The gates and whether they are on unless the configuration says otherwise
+FEATURES = { "meters": 0, "positions": 0, "params": 1, "names": 1, "corrections": 0 }
+
+def defaultPath():
+    """Returns the path of LiveOSC.cfg in the directory of the script"""
+    end = max(__file__.rfind("/"), __file__.rfind("\\")) + 1
+    return __file__[:end] + "LiveOSC.cfg"
+
+class LiveConfig:
+    """The feature gates"""
+    def __init__(self, path = None):
+        self.values = FEATURES.copy()
+        # Called without arguments whenever a gate changes
+        self.changed = None
+        if path != None:
+            self.load(path)
+
+    def load(self, path):
+        """Reads the gates from the file (path), if there is one"""
+        try:
+            f = open(path)
+        except IOError:
+            return
+        try:
+            lines = f.readlines()
+        finally:
+            f.close()
+
+        for line in lines:
+            line = line.split("#")[0].strip()
+            if line == "":
+                continue
+            try:
+                name, value = line.split("=", 1)
+                self.set(name.strip(), int(value))
+            except Exception, e:
+                log("LiveConfig: ignoring '" + line + "' in " + path + ": " + str(e))
+
+    def enabled(self, name):
+        """Returns true if the gate (name) is on"""
+        self.check(name)
+        return self.values[name]
+
+    def check(self, name):
+        if not self.values.has_key(name):
+            raise Exception("unknown feature " + name)
+
+    def set(self, name, value):
+        """Switches the gate (name) on or off"""
+        self.check(name)
+        value = int(value != 0)
+        if self.values[name] != value:
+            self.values[name] = value
+            if self.changed != None:
+                self.changed()
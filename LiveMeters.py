@@ -0,0 +1,102 @@
+"""
+LiveMeters, the output meters of the Live song sampled at a fixed rate.
+
+Listening to the output meters makes Live call LiveOSC for the left and
+right meter of every track on every frame, and each call sent its own
+datagram.  MeterSampler instead reads all meters from update_display()
+once per tick and sends them at most once every interval seconds in one
+message:
+
+    /live/meters (int tracks, int returns, int master, blob levels)
+
+levels holds two bytes for the left and two for the right channel of
+each of the visible tracks, the return tracks and, if master is 1, the
+master track: the level and the peak hold, scaled from 0.0 - 1.0 to
+0 - 255.  Tracks without audio output read as 0.
+
+So that transients are not lost when frames are sent less often than
+the meters are read, the level is the highest one read since the last
+frame, or the last level sent decayed by decay per second if that is
+higher.  The peak hold is the highest level of the last holdTime
+seconds.
+"""
+
+import struct
+import time
+import OSC
+
+def level(value):
+    """Returns the meter value (value) scaled to 0 - 255"""
+    return int(min(max(value, 0.0), 1.0) * 255 + 0.5)
+
+class MeterSampler:
+    """Reads the meters of the song and sends them as /live/meters frames"""
+    def __init__(self, oscEndpoint, interval = 0.1, holdTime = 1.0, decay = 1.5):
+        self.oscEndpoint = oscEndpoint
+        self.interval = interval
+        self.holdTime = holdTime
+        self.decay = decay
+        self.last = 0.0
+        # The number of tracks, returns and master tracks of the frames,
+        # and for each channel the highest level read since the last
+        # frame, the level last sent, the peak hold and when it was set
+        self.layout = None
+        self.peaks = []
+        self.shown = []
+        self.holds = []
+        self.held = []
+
+    def read(self, track, levels):
+        if track.has_audio_output:
+            levels.append(track.output_meter_left)
+            levels.append(track.output_meter_right)
+        else:
+            levels.extend((0.0, 0.0))
+
+    def sample(self, tracks, returns, master):
+        """Reads the meters of the lists of tracks (tracks) and (returns) and of the master track (master) unless it is None,
+        and sends a frame if the last one was sent at least interval seconds ago"""
+        levels = []
+        for track in tracks:
+            self.read(track, levels)
+        for track in returns:
+            self.read(track, levels)
+        if master != None:
+            self.read(master, levels)
+
+        layout = (len(tracks), len(returns), int(master != None))
+        if layout != self.layout:
+            self.layout = layout
+            self.peaks = [0.0] * len(levels)
+            self.shown = [0.0] * len(levels)
+            self.holds = [0.0] * len(levels)
+            self.held = [0.0] * len(levels)
+
+        peaks = self.peaks
+        for i in range(len(levels)):
+            if levels[i] > peaks[i]:
+                peaks[i] = levels[i]
+
+        now = time.time()
+        if now - self.last >= self.interval:
+            self.send(now)
+
+    def send(self, now):
+        fall = self.decay * (now - self.last)
+        self.last = now
+
+        frame = []
+        for i in range(len(self.peaks)):
+            peak = self.peaks[i]
+            self.peaks[i] = 0.0
+            shown = max(peak, self.shown[i] - fall)
+            self.shown[i] = shown
+            if peak >= self.holds[i] or now - self.held[i] > self.holdTime:
+                self.holds[i] = peak
+                self.held[i] = now
+            frame.append(level(shown))
+            frame.append(level(self.holds[i]))
+
+        message = OSC.OSCMessage("/live/meters", self.layout)
+        message.append(struct.pack(">%dB" % len(frame), *frame), 'b')
+        self.oscEndpoint.sendMessage(message)
@@ -0,0 +1,286 @@
+"""
+LiveMirror, a copy of the state of the Live song that LiveOSC keeps
+current from its listeners.
+
+Reading a property of a Live object crosses into Live's C++ object
+model, which is the main cost of answering a query.  LiveMirror holds
+one record per track, return track and the master track with the
+values that LiveOSC has listeners for, so that LiveOSCCallbacks can
+answer queries for them without touching Live.  Device parameters are
+only listened to for the banks that clients select, so their names and
+values are read from Live; of the devices just the names are mirrored.
+Only writes go to Live; the listeners that fire as a result bring the
+mirror up to date.
+
+The mirror is rebuilt by LiveOSC.refresh_state() whenever the tracks,
+devices or parameters of the song change.  Only tracks that are new or
+have been invalidated are read from Live again; the records of the
+others are kept.  Until it has been built, ready is false and queries
+have to read Live.  LiveOSC only rebuilds at its next tick, and sets
+stale in the meantime, during which queries read Live as well.  Unless
+names is true, the names of the tracks, clips and scenes and the colours
+of the clips are not mirrored but left empty, and queries for them read
+Live.  The length of a clip is kept current by its loop listeners.
+
+snapshot() packs the mirror into one binary string for /live/snapshot,
+in the format described in OSCAPI.txt.  version changes whenever the
+mirror does, so that a client can tell without a new snapshot whether
+its own is still current.
+"""
+
+import struct
+import time
+import LiveUtils
+
+TRACK = LiveUtils.TRACK
+RETURN = LiveUtils.RETURN
+MASTER = LiveUtils.MASTER
+
+def clipState(clip):
+    """Returns the state of (clip) as used in /live/clip/info: 0 = No Clip, 1 = Has Clip, 2 = Playing, 3 = Triggered"""
+    if clip == None:
+        return 0
+    if clip.is_playing:
+        return 2
+    if clip.is_triggered:
+        return 3
+    return 1
+
+def gridCell(clip):
+    """Returns the grid state and colour of (clip), a Live clip, a ClipRecord or None, for /live/grid
+
+    The state is 0 = No Clip, 1 = Stopped, 2 = Playing, 3 = Triggered, 4 = Recording and the colour
+    is reduced to 8 bits, 3 red, 3 green and 2 blue.
+    """
+    if clip == None:
+        return (0, 0)
+    if isinstance(clip, ClipRecord):
+        state = clip.state
+        recording = clip.recording
+    else:
+        state = clipState(clip)
+        recording = clip.is_recording
+    if recording:
+        state = 4
+    color = clip.color
+    return (state, (color >> 16 & 0xe0) | (color >> 11 & 0x1c) | (color >> 6 & 0x03))
+
+def packString(s):
+    """Packs a string as its 16 bit length followed by its bytes"""
+    s = s[:0xffff]
+    return struct.pack(">H", len(s)) + s
+
+def packFloats(values):
+    """Packs a list of floats, preceded by their 8 bit count"""
+    return struct.pack(">B%df" % len(values), len(values), *values)
+
+class ClipRecord:
+    """The mirrored state of one clip, with its name and colour unless (names) is false"""
+    def __init__(self, clip, names = 1):
+        self.update(clip, names)
+
+    def update(self, clip, names = 1):
+        if names:
+            self.name = str(clip.name)
+            self.color = clip.color
+        else:
+            self.name = ""
+            self.color = 0
+        self.length = clip.length
+        self.state = clipState(clip)
+        self.recording = int(clip.is_recording)
+
+    def values(self):
+        return (self.name, self.color, self.length, self.state, self.recording)
+
+class DeviceRecord:
+    """The mirrored name of a device, and its parameters"""
+    def __init__(self, device):
+        self.device = device
+        self.name = str(device.name)
+        self.parameters = device.parameters
+
+class TrackRecord:
+    """The mirrored state of a track, return track or the master track, with the names unless (names) is false"""
+    def __init__(self, track, kind, names = 1):
+        self.kind = kind
+        mixer = track.mixer_device
+        self.volume = float(mixer.volume.value)
+        self.panning = float(mixer.panning.value)
+        self.devices = []
+        for device in track.devices:
+            self.devices.append(DeviceRecord(device))
+
+        if kind == MASTER:
+            self.crossfader = float(mixer.crossfader.value)
+            return
+
+        self.name = names and str(track.name) or ""
+        self.mute = int(track.mute)
+        self.solo = int(track.solo)
+        self.sends = []
+        for send in mixer.sends:
+            self.sends.append(float(send.value))
+
+        self.arm = 0
+        self.clips = []
+        if kind == TRACK:
+            if track.can_be_armed:
+                self.arm = int(track.arm)
+            for slot in track.clip_slots:
+                if slot.clip != None:
+                    self.clips.append(ClipRecord(slot.clip, names))
+                else:
+                    self.clips.append(None)
+
+class LiveMirror:
+    """The mirrored state of the song"""
+    def __init__(self):
+        self.ready = 0
+        self.stale = 0
+        self.names = 1
+        self.tracks = []
+        self.returns = []
+        self.master = None
+        self.scenes = []
+        # Records indexed by their Live track
+        self.records = {}
+        # Never 0, and different each time the script is loaded
+        self.version = int(time.time()) % 0x7fffffff + 1
+
+    def changed(self):
+        """Gives the mirror a new version, called whenever it changes"""
+        self.version = self.version % 0x7fffffff + 1
+
+    def rebuild(self, song):
+        """Mirrors the tracks of (song), reading only those from Live that have no valid record"""
+        old = self.records
+        self.records = {}
+        self.tracks = self.buildRecords(song.visible_tracks, TRACK, old)
+        self.returns = self.buildRecords(song.return_tracks, RETURN, old)
+        self.master = self.buildRecords([song.master_track], MASTER, old)[0]
+        self.scenes = []
+        for scene in song.scenes:
+            self.scenes.append(self.names and str(scene.name) or "")
+        self.ready = 1
+        self.stale = 0
+        self.changed()
+
+    def buildRecords(self, tracks, kind, old):
+        records = []
+        for track in tracks:
+            record = old.get(track)
+            if record == None or record.kind != kind:
+                record = TrackRecord(track, kind, self.names)
+            self.records[track] = record
+            records.append(record)
+        return records
+
+    def invalidate(self, track = None):
+        """Makes the next rebuild() read (track) from Live again, or all tracks if it is None"""
+        if track == None:
+            self.records = {}
+        elif self.records.has_key(track):
+            del self.records[track]
+
+    def track(self, kind, num = 0):
+        """Returns the record of visible track, return track or the master track number (num), depending on (kind)"""
+        if kind == MASTER:
+            return self.master
+        if kind == RETURN:
+            records = self.returns
+        else:
+            records = self.tracks
+        LiveUtils.checkRange('track', num, 1, len(records))
+        return records[num]
+
+    def clip(self, track, clip):
+        """Returns the record of clip number (clip) in track (track), None if the slot is empty"""
+        clips = self.track(TRACK, track).clips
+        LiveUtils.checkRange('clip', clip, 1, len(clips))
+        return clips[clip]
+
+    def clipBlock(self, track, clip, width, height):
+        """Returns a list of (height) rows of the clip records in (width) tracks, like LiveUtils.getClipBlock()"""
+        LiveUtils.checkRange('track', track, width, len(self.tracks))
+        block = []
+        for row in range(height):
+            block.append([])
+        for record in self.tracks[track:track + width]:
+            LiveUtils.checkRange('clip', clip, height, len(record.clips))
+            row = 0
+            for c in record.clips[clip:clip + height]:
+                block[row].append(c)
+                row = row + 1
+        return block
+
+    def record(self, track):
+        """Returns the record of the Live track (track), None if it is not mirrored"""
+        return self.records.get(track)
+
+    def updateDevice(self, track, device):
+        """Updates the name of the record of (device) on the Live track (track)"""
+        record = self.records.get(track)
+        if record == None:
+            return
+        for d in record.devices:
+            if d.device == device:
+                d.name = str(device.name)
+        self.changed()
+
+    def updateScene(self, num, scene):
+        """Updates the name of scene number (num) from the Live scene (scene)"""
+        if num < len(self.scenes):
+            self.scenes[num] = str(scene.name)
+            self.changed()
+
+    def updateClip(self, track, clip, liveClip):
+        """Updates the record of clip number (clip) in track (track) from (liveClip), which is None for an empty slot"""
+        if not self.ready or track >= len(self.tracks):
+            return
+        clips = self.tracks[track].clips
+        if clip >= len(clips):
+            return
+        if liveClip == None:
+            if clips[clip] == None:
+                return
+            clips[clip] = None
+        elif clips[clip] == None:
+            clips[clip] = ClipRecord(liveClip, self.names)
+        else:
+            values = clips[clip].values()
+            clips[clip].update(liveClip, self.names)
+            if clips[clip].values() == values:
+                return
+        self.changed()
+
+    def snapshot(self):
+        """Returns the mirror packed into a string"""
+        parts = [struct.pack(">HHH", len(self.tracks), len(self.scenes), len(self.returns))]
+        for name in self.scenes:
+            parts.append(packString(name))
+
+        for record in self.tracks + self.returns + [self.master]:
+            if record.kind == MASTER:
+                parts.append(packString("Master"))
+                parts.append(struct.pack(">B", 0))
+                parts.append(packFloats([record.volume, record.panning, record.crossfader]))
+                parts.append(packFloats([]))
+            else:
+                parts.append(packString(record.name))
+                parts.append(struct.pack(">B", record.arm | record.mute << 1 | record.solo << 2))
+                parts.append(packFloats([record.volume, record.panning]))
+                parts.append(packFloats(record.sends))
+            parts.append(struct.pack(">B", len(record.devices)))
+            for device in record.devices:
+                parts.append(packString(device.name))
+
+        for record in self.tracks:
+            for clip in record.clips:
+                if clip == None:
+                    parts.append(struct.pack(">B", 0))
+                else:
+                    parts.append(struct.pack(">B", clip.state))
+                    parts.append(packString(clip.name))
+                    parts.append(struct.pack(">if", clip.color, clip.length))
+        return "".join(parts)
@@ -32,27 +32,124 @@ import LiveOSCCallbacks
 import RemixNet
 import OSC
 import LiveUtils
+import LiveMirror
+import LiveMeters
+import LiveAnchors
+import LiveConfig
 import sys
+import time
 from Logger import log
 
+class ListenerSet:
+    """The listeners that LiveOSC has added to Live objects
+
+    Each listener is keyed by its object and property and calls
+    function(*args).  Between begin() and end(), want() keeps a listener
+    whose function and arguments are unchanged and replaces the others;
+    end() then removes the listeners that were not wanted again, so a
+    refresh only touches what has actually changed.
+    """
+    def __init__(self):
+        self.listeners = {}
+        self.wanted = None
+
+    def target(self, obj, prop):
+        # A property of the form "view.selected_device" is one of obj.view
+        if prop.find(".") != -1:
+            path, prop = prop.split(".")
+            obj = getattr(obj, path)
+        return obj, prop
+
+    def want(self, obj, prop, function, args):
+        """Makes sure (obj) has a listener on (prop) calling function(*args), returns 1 if it had to be added"""
+        key = (obj, prop)
+        if self.wanted != None:
+            self.wanted[key] = 1
+
+        if self.listeners.has_key(key):
+            old = self.listeners[key]
+            if old[0] == function and old[1] == args:
+                return 0
+            self.remove(key)
+
+        cb = lambda :function(*args)
+        target, name = self.target(obj, prop)
+        getattr(target, "add_" + name + "_listener")(cb)
+        self.listeners[key] = (function, args, cb)
+        return 1
+
+    def remove(self, key):
+        cb = self.listeners.pop(key)[2]
+        # Objects that have been deleted from the song compare equal to None
+        if key[0] != None:
+            target, name = self.target(*key)
+            if getattr(target, name + "_has_listener")(cb) == 1:
+                getattr(target, "remove_" + name + "_listener")(cb)
+
+    def forget(self, obj, props):
+        """Removes the listeners of (obj) on the properties (props)"""
+        for prop in props:
+            if self.listeners.has_key((obj, prop)):
+                self.remove((obj, prop))
+
+    def begin(self):
+        self.wanted = {}
+
+    def end(self):
+        for key in self.listeners.keys():
+            if not self.wanted.has_key(key):
+                self.remove(key)
+        self.wanted = None
+
+    def clear(self):
+        for key in self.listeners.keys():
+            self.remove(key)
+        self.wanted = None
+
 class LiveOSC:
     __module__ = __name__
     __doc__ = "Main class that establishes the LiveOSC Component"
     
-    prlisten = {}
-    plisten = {}
-    dlisten = {}
-    clisten = {}
-    slisten = {}
-    pplisten = {}
-    cnlisten = {}
-    cclisten = {}
-    
-    mlisten = { "solo": {}, "mute": {}, "arm": {}, "panning": {}, "volume": {}, "sends": {}, "name": {}, "oml": {}, "omr": {} }
-    rlisten = { "solo": {}, "mute": {}, "panning": {}, "volume": {}, "sends": {}, "name": {} }
-    masterlisten = { "panning": {}, "volume": {}, "crossfader": {} }
-    scenelisten = {}
+    # The clip properties that we listen to, the name and colour only
+    # if names are on.  Which clips play is listened to on the tracks,
+    # see slot_index_change(), and their positions are polled, see
+    # poll_positions()
+    clip_properties = ("name", "color", "loop_start", "loop_end")
+
+    # Getters for the track properties that we listen to
+    track_properties = {
+        "arm":  lambda tr: tr.arm,
+        "solo": lambda tr: tr.solo,
+        "mute": lambda tr: tr.mute,
+    }
+
+    # The mixer parameters that we listen to and the address suffix
+    # of their updates
+    mixer_parameters = {
+        "volume":     lambda tr: tr.mixer_device.volume,
+        "panning":    lambda tr: tr.mixer_device.panning,
+        "crossfader": lambda tr: tr.mixer_device.crossfader,
+    }
+    mixer_addresses = { "panning": "pan", "volume": "volume", "crossfader": "crossfader" }
     
+    # Structural changes are refreshed at the next tick, but at most
+    # once every refreshInterval seconds
+    refreshInterval = 0.2
+
+    # The output meters are read every tick and sent at most once every
+    # meterInterval seconds, with peaks held for meterHold seconds and
+    # levels falling by meterDecay per second, see LiveMeters
+    meterInterval = 0.1
+    meterHold = 1.0
+    meterDecay = 1.5
+
+    # The playheads of the playing clips are sent as anchors when they
+    # move more than anchorTolerance beats away from where the clients
+    # extrapolate them, and, with corrections on, again every
+    # anchorCorrection seconds, see LiveAnchors
+    anchorTolerance = 0.1
+    anchorCorrection = 1.0
+
     scene = 0
     track = 0
 
@@ -61,13 +158,31 @@ class LiveOSC:
       
         self.basicAPI = 0       
         self.oscEndpoint = RemixNet.OSCEndpoint()
+        self.config = LiveConfig.LiveConfig(LiveConfig.defaultPath())
+        self.config.changed = self.request_refresh
+        self.mirror = LiveMirror.LiveMirror()
+        self.meters = LiveMeters.MeterSampler(self.oscEndpoint, self.meterInterval, self.meterHold, self.meterDecay)
+        self.anchors = LiveAnchors.ClipAnchors(self.oscEndpoint, self.anchorTolerance, self.anchorCorrection)
+        self.listeners = ListenerSet()
+        # The clip in each clip slot that we have listeners on, and
+        # the playing and fired slot index of each visible track
+        self.slotclips = {}
+        self.slotIndices = {}
+        # Set when the structure of the song changed and the listeners
+        # and the mirror have to be refreshed, or /live/refresh sent
+        self.dirty = 0
+        self.tracksChanged = 0
+        self.lastRefresh = 0.0
+        # The tracks, return tracks and number of scenes at the last
+        # refresh, which the numbers in the state updates refer to
+        self.layout = None
         self.oscEndpoint.send('/remix/oscserver/startup', 1)
         
         log("LiveOSC initialized")
         
         # Visible tracks listener
-        if self.song().visible_tracks_has_listener(self.refresh_state) != 1:
-            self.song().add_visible_tracks_listener(self.refresh_state)
+        if self.song().visible_tracks_has_listener(self.request_refresh) != 1:
+            self.song().add_visible_tracks_listener(self.request_refresh)
         
 ######################################################################
 # Standard Ableton Methods
@@ -102,6 +217,9 @@ class LiveOSC:
         """
         ######################################################
         # START OSC LISTENER SETUP
+
+        # The structure of the song that LiveUtils caches is valid for one tick
+        LiveUtils.invalidateCache()
               
         if self.basicAPI == 0:
             # By default we have set basicAPI to 0 so that we can assign it after
@@ -119,7 +237,7 @@ class LiveOSC:
                 log('could not get song handle')
                 return
             try:
-                self.basicAPI = LiveOSCCallbacks.LiveOSCCallbacks(self._LiveOSC__c_instance, self.oscEndpoint)
+                self.basicAPI = LiveOSCCallbacks.LiveOSCCallbacks(self._LiveOSC__c_instance, self.oscEndpoint, self.mirror, self.config)
                 # Commented for stability
                 self.time = 0
                 doc.add_current_song_time_listener(self.current_song_time_changed)
@@ -132,11 +250,53 @@ class LiveOSC:
             # Any 'play' initiation will trigger the current_song_time listener
             # and bump updates from 100ms to 60ms.
             
-        if self.oscEndpoint:
+        # What was queued is sent even if an update fails, e.g.
+        # on an object that has been deleted from the song
+        try:
+            # Structural changes since the last tick are handled in one go
+            if self.dirty and time.time() - self.lastRefresh >= self.refreshInterval:
+                try:
+                    self.refresh_state()
+                except:
+                    log('error refreshing state:', sys.exc_info());
+                    # Tried again after the next refreshInterval
+                    self.dirty = 1
+
+            if self.tracksChanged:
+                self.tracksChanged = 0
+                self.oscEndpoint.send("/live/refresh", (1))
+
+            try:
+                self.sample_meters()
+            except:
+                log('error sampling meters:', sys.exc_info());
             try:
-                self.oscEndpoint.processIncomingUDP()
+                self.poll_positions()
             except:
-                log('error processing incoming UDP packets:', sys.exc_info());
+                log('error polling positions:', sys.exc_info());
+            try:
+                self.correct_anchors()
+            except:
+                log('error correcting anchors:', sys.exc_info());
+
+            if self.oscEndpoint:
+                try:
+                    self.oscEndpoint.processIncomingUDP()
+                except:
+                    log('error processing incoming UDP packets:', sys.exc_info());
+
+                if self.basicAPI:
+                    try:
+                        self.basicAPI.updateGrids()
+                    except:
+                        log('error updating grids:', sys.exc_info());
+                    try:
+                        self.basicAPI.updateWatches()
+                    except:
+                        log('error updating watches:', sys.exc_info());
+        finally:
+            if self.oscEndpoint:
+                self.oscEndpoint.flush()
             
         # END OSC LISTENER SETUP
         ######################################################
@@ -146,6 +306,7 @@ class LiveOSC:
         if int(time) != self.time:
             self.time = int(time)
             self.oscEndpoint.send("/live/beat", self.time)
+        self.oscEndpoint.flush()
 
     def send_midi(self, midi_event_bytes):
         """
@@ -199,54 +360,98 @@ class LiveOSC:
         
         for track in range(0, blocksize):
             block.extend([str(tracks[trackOffset+track].name)])                            
-        self.oscEndpoint.send("/live/name/trackblock", block)        
+        self.oscEndpoint.sendCoalesced("/live/name/trackblock", block)        
 
 ######################################################################
 # Used Ableton Methods
 
     def disconnect(self):
-        self.rem_clip_listeners()
-        self.rem_mixer_listeners()
+        self.listeners.clear()
+        if self.basicAPI:
+            self.basicAPI.watches.clear()
+        self.slotclips = {}
+        self.anchors.clear()
         self.rem_scene_listeners()
         self.rem_tempo_listener()
         self.rem_overdub_listener()
         self.rem_tracks_listener()
-        self.rem_device_listeners()
         self.rem_transport_listener()
         
-        self.song().remove_visible_tracks_listener(self.refresh_state)
+        self.song().remove_visible_tracks_listener(self.request_refresh)
         
         self.oscEndpoint.send('/remix/oscserver/shutdown', 1)
         self.oscEndpoint.shutdown()
             
     def build_midi_map(self, midi_map_handle):
-        self.refresh_state()            
+        if self.mirror.ready:
+            self.request_refresh()
+        else:
+            self.refresh_state()
+
+    def request_refresh(self):
+        """Marks the structure of the song as changed, it is refreshed at the next update_display()"""
+        self.dirty = 1
+        self.mirror.stale = 1
             
     def refresh_state(self):
-        self.add_clip_listeners()
-        self.add_mixer_listeners()
+        self.dirty = 0
+        self.lastRefresh = time.time()
+        LiveUtils.invalidateCache()
+        names = self.config.enabled("names")
+        if names != self.mirror.names:
+            # Without the name listeners the names can not be mirrored
+            self.mirror.names = names
+            self.mirror.invalidate()
+        self.mirror.rebuild(self.song())
+        # The clips may have moved to other tracks, their anchors are
+        # sent again by the next poll_positions()
+        self.anchors.clear()
+        song = self.song()
+        layout = (tuple(song.visible_tracks), tuple(song.return_tracks), len(song.scenes))
+        if layout != self.layout:
+            # The state updates remembered for /remix/resync would
+            # refer to the wrong tracks and clips
+            if self.layout != None:
+                self.oscEndpoint.forgetIndexedState()
+            self.layout = layout
+
+        # Listeners that are still the same are kept, so only the tracks
+        # whose listeners changed need their names sent again
+        self.listeners.begin()
+        changed = self.add_clip_listeners()
+        for trackNumber in self.add_mixer_listeners():
+            changed[trackNumber] = 1
+        self.add_device_listeners()
+        self.add_structure_listeners()
+        self.listeners.end()
+
         self.add_scene_listeners()
         self.add_tempo_listener()
         self.add_overdub_listener()
         self.add_tracks_listener()
-        self.add_device_listeners()
         self.add_transport_listener()
 
-        trackNumber = 0
-        clipNumber = 0
-       
-        for track in self.song().visible_tracks:
+        if self.basicAPI:
+            self.basicAPI.rebindWatches()
+
+        if not names:
+            return
+
+        tracks = self.song().visible_tracks
+        trackNumbers = changed.keys()
+        trackNumbers.sort()
+        for trackNumber in trackNumbers:
+            track = tracks[trackNumber]
             bundle = OSC.OSCBundle()
             bundle.append("/live/name/track", (trackNumber, str(track.name)))
+            clipNumber = 0
             for clipSlot in track.clip_slots:
                 if clipSlot.clip != None:
                     bundle.append("/live/name/clip", (trackNumber, clipNumber, str(clipSlot.clip.name), clipSlot.clip.color))
                 clipNumber = clipNumber + 1
-            clipNumber = 0
-            trackNumber = trackNumber + 1
             self.oscEndpoint.sendMessage(bundle)
         
-        self.trBlock(0, len(self.song().visible_tracks))
+        self.trBlock(0, len(tracks))
 
 ######################################################################
 # Add / Remove Listeners   
@@ -278,7 +483,7 @@ class LiveOSC:
                 
         if selected_index != self.track:
             self.track = selected_index
-            self.oscEndpoint.send("/live/track", (selected_index))
+            self.oscEndpoint.sendCoalesced("/live/track", (selected_index))
 
     def scene_change(self):
         selected_scene = self.song().view.selected_scene
@@ -292,7 +497,7 @@ class LiveOSC:
                 
         if selected_index != self.scene:
             self.scene = selected_index
-            self.oscEndpoint.send("/live/scene", (selected_index))
+            self.oscEndpoint.sendCoalesced("/live/scene", (selected_index))
 	
     def add_tempo_listener(self):
         self.rem_tempo_listener()
@@ -307,7 +512,9 @@ class LiveOSC:
     
     def tempo_change(self):
         tempo = LiveUtils.getTempo()
-        self.oscEndpoint.send("/live/tempo", (tempo))
+        self.oscEndpoint.sendCoalesced("/live/tempo", (tempo))
+        if self.config.enabled("positions"):
+            self.anchors.resend(self.song())
 	
     def add_transport_listener(self):
         if self.song().is_playing_has_listener(self.transport_change) != 1:
@@ -318,7 +525,7 @@ class LiveOSC:
             self.song().remove_is_playing_listener(self.transport_change)    
     
     def transport_change(self):
-        self.oscEndpoint.send("/live/play", (self.song().is_playing and 2 or 1))
+        self.oscEndpoint.sendCoalesced("/live/play", (self.song().is_playing and 2 or 1))
     
     def add_overdub_listener(self):
         self.rem_overdub_listener()
@@ -332,7 +539,7 @@ class LiveOSC:
 	    
     def overdub_change(self):
         overdub = LiveUtils.getSong().overdub
-        self.oscEndpoint.send("/live/overdub", (int(overdub) + 1))
+        self.oscEndpoint.sendCoalesced("/live/overdub", (int(overdub) + 1))
 	
     def add_tracks_listener(self):
         self.rem_tracks_listener()
@@ -341,221 +548,87 @@ class LiveOSC:
             self.song().add_tracks_listener(self.tracks_change)
     
     def rem_tracks_listener(self):
-        if self.song().tracks_has_listener(self.tempo_change) == 1:
+        if self.song().tracks_has_listener(self.tracks_change) == 1:
             self.song().remove_tracks_listener(self.tracks_change)
     
     def tracks_change(self):
-        self.oscEndpoint.send("/live/refresh", (1))
-
-    def rem_clip_listeners(self):
-        for slot in self.slisten:
-            if slot != None:
-                if slot.has_clip_has_listener(self.slisten[slot]) == 1:
-                    slot.remove_has_clip_listener(self.slisten[slot])
-    
-        self.slisten = {}
-        
-        for clip in self.clisten:
-            if clip != None:
-                if clip.playing_status_has_listener(self.clisten[clip]) == 1:
-                    clip.remove_playing_status_listener(self.clisten[clip])
-                
-        self.clisten = {}
-
-        for clip in self.pplisten:
-            if clip != None:
-                if clip.playing_position_has_listener(self.pplisten[clip]) == 1:
-                    clip.remove_playing_position_listener(self.pplisten[clip])
-                
-        self.pplisten = {}
+        LiveUtils.invalidateCache()
+        self.tracksChanged = 1
+
+    def add_structure_listeners(self):
+        song = self.song()
+        self.listeners.want(song, "scenes", self.structure_change, ())
+        self.listeners.want(song, "return_tracks", self.structure_change, ())
+        if not self.config.enabled("names"):
+            return
+        scenes = song.scenes
+        for i in range(len(scenes)):
+            self.listeners.want(scenes[i], "name", self.mirror.updateScene, (i, scenes[i]))
+
+    def structure_change(self):
+        # Adding or removing scenes or return tracks changes every track
+        self.mirror.invalidate()
+        self.request_refresh()
 
-        for clip in self.cnlisten:
-            if clip != None:
-                if clip.name_has_listener(self.cnlisten[clip]) == 1:
-                    clip.remove_name_listener(self.cnlisten[clip])
-                
-        self.cnlisten = {}
-
-        for clip in self.cclisten:
-            if clip != None:
-                if clip.color_has_listener(self.cclisten[clip]) == 1:
-                    clip.remove_color_listener(self.cclisten[clip])
-                
-        self.cclisten = {}
-        
     def add_clip_listeners(self):
-        self.rem_clip_listeners()
-    
-        tracks = self.getslots()
+        """Adds the playing and fired slot listeners of the tracks, the clip slot listeners and the clip loop and,
+        if names are on, name listeners, returns the numbers of the tracks whose listeners changed in a dict"""
+        changed = {}
+        self.slotIndices = {}
+        tracks = self.song().visible_tracks
         for track in range(len(tracks)):
-            for clip in range(len(tracks[track])):
-                c = tracks[track][clip]
+            if self.add_slotindexlistener(tracks[track], track):
+                changed[track] = 1
+            slots = tracks[track].clip_slots
+            for clip in range(len(slots)):
+                c = slots[clip]
                 if c.clip != None:
-                    self.add_cliplistener(c.clip, track, clip)
-                    log("ClipLauncher: added clip listener tr: " + str(track) + " clip: " + str(clip));
+                    if self.add_cliplistener(c.clip, track, clip):
+                        changed[track] = 1
+                    self.slotclips[c] = c.clip
                 
-                self.add_slotlistener(c, track, clip)
+                if self.add_slotlistener(c, track, clip):
+                    changed[track] = 1
+        return changed
         
+    def add_slotindexlistener(self, track, tid):
+        self.slotIndices[tid] = (track.playing_slot_index, track.fired_slot_index)
+        args = (track, tid)
+        added = self.listeners.want(track, "playing_slot_index", self.slot_index_change, args)
+        return self.listeners.want(track, "fired_slot_index", self.slot_index_change, args) + added
+
     def add_cliplistener(self, clip, tid, cid):
-        cb = lambda :self.clip_changestate(clip, tid, cid)
-        
-        if self.clisten.has_key(clip) != 1:
-            clip.add_playing_status_listener(cb)
-            self.clisten[clip] = cb
-            
-        cb2 = lambda :self.clip_position(clip, tid, cid)
-        if self.pplisten.has_key(clip) != 1:
-            clip.add_playing_position_listener(cb2)
-            self.pplisten[clip] = cb2
-            
-        cb3 = lambda :self.clip_name(clip, tid, cid)
-        if self.cnlisten.has_key(clip) != 1:
-            clip.add_name_listener(cb3)
-            self.cnlisten[clip] = cb3
-
-        if self.cclisten.has_key(clip) != 1:
-            clip.add_color_listener(cb3)
-            self.cclisten[clip] = cb3
+        args = (clip, tid, cid)
+        # The length of the clip changes with its loop
+        added = self.listeners.want(clip, "loop_start", self.clip_loop, args)
+        added = self.listeners.want(clip, "loop_end", self.clip_loop, args) + added
+        if self.config.enabled("names"):
+            added = self.listeners.want(clip, "name", self.clip_name, args) + added
+            added = self.listeners.want(clip, "color", self.clip_name, args) + added
+
+        if added:
+            log("ClipLauncher: added clip listener tr: " + str(tid) + " clip: " + str(cid));
+        return added
         
     def add_slotlistener(self, slot, tid, cid):
-        cb = lambda :self.slot_changestate(slot, tid, cid)
-        
-        if self.slisten.has_key(slot) != 1:
-            slot.add_has_clip_listener(cb)
-            self.slisten[slot] = cb   
-            
-    
-    def rem_mixer_listeners(self):
-        # Master Track
-        for type in ("volume", "panning", "crossfader"):
-            for tr in self.masterlisten[type]:
-                if tr != None:
-                    cb = self.masterlisten[type][tr]
-                
-                    test = eval("tr.mixer_device." + type+ ".value_has_listener(cb)")
-                
-                    if test == 1:
-                        eval("tr.mixer_device." + type + ".remove_value_listener(cb)")
-
-        # Normal Tracks
-        for type in ("arm", "solo", "mute"):
-            for tr in self.mlisten[type]:
-                if tr != None:
-                    cb = self.mlisten[type][tr]
-                    
-                    if type == "arm":
-                        if tr.can_be_armed == 1:
-                            if tr.arm_has_listener(cb) == 1:
-                                tr.remove_arm_listener(cb)
-                                
-                    else:
-                        test = eval("tr." + type+ "_has_listener(cb)")
-                
-                        if test == 1:
-                            eval("tr.remove_" + type + "_listener(cb)")
-                
-        for type in ("volume", "panning"):
-            for tr in self.mlisten[type]:
-                if tr != None:
-                    cb = self.mlisten[type][tr]
-                
-                    test = eval("tr.mixer_device." + type+ ".value_has_listener(cb)")
-                
-                    if test == 1:
-                        eval("tr.mixer_device." + type + ".remove_value_listener(cb)")
-         
-        for tr in self.mlisten["sends"]:
-            if tr != None:
-                for send in self.mlisten["sends"][tr]:
-                    if send != None:
-                        cb = self.mlisten["sends"][tr][send]
-
-                        if send.value_has_listener(cb) == 1:
-                            send.remove_value_listener(cb)
-                        
-                        
-        for tr in self.mlisten["name"]:
-            if tr != None:
-                cb = self.mlisten["name"][tr]
-
-                if tr.name_has_listener(cb) == 1:
-                    tr.remove_name_listener(cb)
-
-        for tr in self.mlisten["oml"]:
-            if tr != None:
-                cb = self.mlisten["oml"][tr]
-
-                if tr.output_meter_left_has_listener(cb) == 1:
-                    tr.remove_output_meter_left_listener(cb)
-
-        for tr in self.mlisten["omr"]:
-            if tr != None:
-                cb = self.mlisten["omr"][tr]
-
-                if tr.output_meter_right_has_listener(cb) == 1:
-                    tr.remove_output_meter_right_listener(cb)
-                    
-        # Return Tracks                
-        for type in ("solo", "mute"):
-            for tr in self.rlisten[type]:
-                if tr != None:
-                    cb = self.rlisten[type][tr]
-                
-                    test = eval("tr." + type+ "_has_listener(cb)")
-                
-                    if test == 1:
-                        eval("tr.remove_" + type + "_listener(cb)")
-                
-        for type in ("volume", "panning"):
-            for tr in self.rlisten[type]:
-                if tr != None:
-                    cb = self.rlisten[type][tr]
-                
-                    test = eval("tr.mixer_device." + type+ ".value_has_listener(cb)")
-                
-                    if test == 1:
-                        eval("tr.mixer_device." + type + ".remove_value_listener(cb)")
-         
-        for tr in self.rlisten["sends"]:
-            if tr != None:
-                for send in self.rlisten["sends"][tr]:
-                    if send != None:
-                        cb = self.rlisten["sends"][tr][send]
-                
-                        if send.value_has_listener(cb) == 1:
-                            send.remove_value_listener(cb)
-
-        for tr in self.rlisten["name"]:
-            if tr != None:
-                cb = self.rlisten["name"][tr]
-
-                if tr.name_has_listener(cb) == 1:
-                    tr.remove_name_listener(cb)
-                    
-        self.mlisten = { "solo": {}, "mute": {}, "arm": {}, "panning": {}, "volume": {}, "sends": {}, "name": {}, "oml": {}, "omr": {} }
-        self.rlisten = { "solo": {}, "mute": {}, "panning": {}, "volume": {}, "sends": {}, "name": {} }
-        self.masterlisten = { "panning": {}, "volume": {}, "crossfader": {} }
-    
+        return self.listeners.want(slot, "has_clip", self.slot_changestate, (slot, tid, cid))
     
     def add_mixer_listeners(self):
-        self.rem_mixer_listeners()
-        
+        """Adds the mixer listeners, returns the numbers of the tracks whose name listener changed in a dict"""
+        changed = {}
+
         # Master Track
         tr = self.song().master_track
         for type in ("volume", "panning", "crossfader"):
-            self.add_master_listener(0, type, tr)
-        
-        self.add_meter_listener(0, tr, 2)
+            self.add_mixerv_listener(0, type, tr, 2)
         
         # Normal Tracks
         tracks = self.song().visible_tracks
         for track in range(len(tracks)):
             tr = tracks[track]
 
-            self.add_trname_listener(track, tr, 0)
-            
-            if tr.has_audio_output:
-                self.add_meter_listener(track, tr)
+            if self.add_trname_listener(track, tr, 0):
+                changed[track] = 1
             
             for type in ("arm", "solo", "mute"):
                 if type == "arm":
@@ -567,8 +640,9 @@ class LiveOSC:
             for type in ("volume", "panning"):
                 self.add_mixerv_listener(track, type, tr)
                 
-            for sid in range(len(tr.mixer_device.sends)):
-                self.add_send_listener(track, tr, sid, tr.mixer_device.sends[sid])
+            sends = tr.mixer_device.sends
+            for sid in range(len(sends)):
+                self.add_send_listener(track, tr, sid, sends[sid])
         
         # Return Tracks
         tracks = self.song().return_tracks
@@ -576,127 +650,85 @@ class LiveOSC:
             tr = tracks[track]
 
             self.add_trname_listener(track, tr, 1)
-            self.add_meter_listener(track, tr, 1)
             
             for type in ("solo", "mute"):
-                self.add_retmixert_listener(track, type, tr)
+                self.add_mixert_listener(track, type, tr, 1)
                 
             for type in ("volume", "panning"):
-                self.add_retmixerv_listener(track, type, tr)
+                self.add_mixerv_listener(track, type, tr, 1)
             
-            for sid in range(len(tr.mixer_device.sends)):
-                self.add_retsend_listener(track, tr, sid, tr.mixer_device.sends[sid])
-        
-    
-    # Add track listeners
-    def add_send_listener(self, tid, track, sid, send):
-        if self.mlisten["sends"].has_key(track) != 1:
-            self.mlisten["sends"][track] = {}
-                    
-        if self.mlisten["sends"][track].has_key(send) != 1:
-            cb = lambda :self.send_changestate(tid, track, sid, send)
-            
-            self.mlisten["sends"][track][send] = cb
-            send.add_value_listener(cb)
-    
-    def add_mixert_listener(self, tid, type, track):
-        if self.mlisten[type].has_key(track) != 1:
-            cb = lambda :self.mixert_changestate(type, tid, track)
-            
-            self.mlisten[type][track] = cb
-            eval("track.add_" + type + "_listener(cb)")
-            
-    def add_mixerv_listener(self, tid, type, track):
-        if self.mlisten[type].has_key(track) != 1:
-            cb = lambda :self.mixerv_changestate(type, tid, track)
-            
-            self.mlisten[type][track] = cb
-            eval("track.mixer_device." + type + ".add_value_listener(cb)")
+            sends = tr.mixer_device.sends
+            for sid in range(len(sends)):
+                self.add_send_listener(track, tr, sid, sends[sid], 1)
 
-    # Add master listeners
-    def add_master_listener(self, tid, type, track):
-        if self.masterlisten[type].has_key(track) != 1:
-            cb = lambda :self.mixerv_changestate(type, tid, track, 2)
-            
-            self.masterlisten[type][track] = cb
-            eval("track.mixer_device." + type + ".add_value_listener(cb)")
-            
-            
-    # Add return listeners
-    def add_retsend_listener(self, tid, track, sid, send):
-        if self.rlisten["sends"].has_key(track) != 1:
-            self.rlisten["sends"][track] = {}
-                    
-        if self.rlisten["sends"][track].has_key(send) != 1:
-            cb = lambda :self.send_changestate(tid, track, sid, send, 1)
-            
-            self.rlisten["sends"][track][send] = cb
-            send.add_value_listener(cb)
+        return changed
     
-    def add_retmixert_listener(self, tid, type, track):
-        if self.rlisten[type].has_key(track) != 1:
-            cb = lambda :self.mixert_changestate(type, tid, track, 1)
-            
-            self.rlisten[type][track] = cb
-            eval("track.add_" + type + "_listener(cb)")
-            
-    def add_retmixerv_listener(self, tid, type, track):
-        if self.rlisten[type].has_key(track) != 1:
-            cb = lambda :self.mixerv_changestate(type, tid, track, 1)
+    # Track listeners, (r) is 0 for tracks, 1 for return tracks and 2 for the master track
+    def add_send_listener(self, tid, track, sid, send, r = 0):
+        self.listeners.want(send, "value", self.send_changestate, (tid, track, sid, send, r))
+    
+    def add_mixert_listener(self, tid, type, track, r = 0):
+        get = self.track_properties[type]
+        self.listeners.want(track, type, self.mixert_changestate, (type, tid, track, get, r))
             
-            self.rlisten[type][track] = cb
-            eval("track.mixer_device." + type + ".add_value_listener(cb)")      
-
+    def add_mixerv_listener(self, tid, type, track, r = 0):
+        param = self.mixer_parameters[type](track)
+        self.listeners.want(param, "value", self.mixerv_changestate, (type, tid, track, param, r))
 
     # Track name listener
     def add_trname_listener(self, tid, track, ret = 0):
-        cb = lambda :self.trname_changestate(tid, track, ret)
-
-        if ret == 1:
-            if self.rlisten["name"].has_key(track) != 1:
-                self.rlisten["name"][track] = cb
-        
-        else:
-            if self.mlisten["name"].has_key(track) != 1:
-                self.mlisten["name"][track] = cb
-        
-        track.add_name_listener(cb)
+        if not self.config.enabled("names"):
+            return 0
+        return self.listeners.want(track, "name", self.trname_changestate, (tid, track, ret))
         
-    # Output Meter Listeners
-    def add_meter_listener(self, tid, track, r = 0):
-        cb = lambda :self.meter_changestate(tid, track, 0, r)
-
-        if self.mlisten["oml"].has_key(track) != 1:
-            self.mlisten["oml"][track] = cb
-
-        track.add_output_meter_left_listener(cb)
-
-        cb = lambda :self.meter_changestate(tid, track, 1, r)
-
-        if self.mlisten["omr"].has_key(track) != 1:
-            self.mlisten["omr"][track] = cb
-
-        track.add_output_meter_right_listener(cb)
-
 ######################################################################
 # Listener Callbacks
         
     # Clip Callbacks
     def clip_name(self, clip, tid, cid):
-        self.oscEndpoint.send('/live/name/clip', (tid, cid, str(clip.name), clip.color))
+        self.mirror.updateClip(tid, cid, clip)
+        self.oscEndpoint.sendCoalesced('/live/name/clip', (tid, cid, str(clip.name), clip.color), 2)
     
+    def clip_loop(self, clip, tid, cid):
+        self.mirror.updateClip(tid, cid, clip)
+
     def clip_position(self, clip, tid, cid):
-        if self.check_md(1):
-            if clip.is_playing:
-                self.oscEndpoint.send('/live/clip/position', (tid, cid, clip.playing_position, clip.length, clip.loop_start, clip.loop_end))
+        if not self.oscEndpoint.wants('/live/clip/anchor'):
+            return
+        if clip.is_playing:
+            song = self.song()
+            self.anchors.update(tid, cid, clip, song.current_song_time, song.tempo)
+
+    def slot_index_change(self, track, tid):
+        """Called when the playing or fired clip slot of a track changes, updates the clips that started or stopped
+        playing or were triggered"""
+        playing = track.playing_slot_index
+        fired = track.fired_slot_index
+        old = self.slotIndices.get(tid, (-1, -1))
+        self.slotIndices[tid] = (playing, fired)
+
+        slots = track.clip_slots
+        changed = {}
+        for cid in old + (playing, fired):
+            if cid >= 0 and cid < len(slots):
+                changed[cid] = 1
+        cids = changed.keys()
+        cids.sort()
+        for cid in cids:
+            clip = slots[cid].clip
+            if clip != None:
+                self.clip_changestate(clip, tid, cid)
     
     def slot_changestate(self, slot, tid, cid):
+        LiveUtils.invalidateCache()
+        self.mirror.updateClip(tid, cid, slot.clip)
         tmptrack = LiveUtils.getTrack(tid)
         armed = tmptrack.arm and 1 or 0
         
         # Added new clip
         if slot.clip != None:
             self.add_cliplistener(slot.clip, tid, cid)
+            self.slotclips[slot] = slot.clip
             
             playing = 1
             if slot.clip.is_playing == 1:
@@ -707,28 +739,24 @@ class LiveOSC:
             
             length =  slot.clip.loop_end - slot.clip.loop_start
             
-            self.oscEndpoint.send('/live/track/info', (tid, armed, cid, playing, length))
-            self.oscEndpoint.send('/live/name/clip', (tid, cid, str(slot.clip.name), slot.clip.color))
+            self.oscEndpoint.sendCoalesced('/live/track/info', (tid, armed, cid, playing, length), key = (tid, cid))
+            if self.config.enabled("names"):
+                self.oscEndpoint.sendCoalesced('/live/name/clip', (tid, cid, str(slot.clip.name), slot.clip.color), 2)
         else:
-            if self.clisten.has_key(slot.clip) == 1:
-                slot.clip.remove_playing_status_listener(self.clisten[slot.clip])
-                
-            if self.pplisten.has_key(slot.clip) == 1:
-                slot.clip.remove_playing_position_listener(self.pplisten[slot.clip])
-
-            if self.cnlisten.has_key(slot.clip) == 1:
-                slot.clip.remove_name_listener(self.cnlisten[slot.clip])
-
-            if self.cclisten.has_key(slot.clip) == 1:
-                slot.clip.remove_color_listener(self.cclisten[slot.clip])
-            
-            self.oscEndpoint.send('/live/track/info', (tid, armed, cid, 0, 0.0))
-            self.oscEndpoint.send('/live/clip/info', (tid, cid, 0))
+            if self.slotclips.has_key(slot):
+                self.listeners.forget(self.slotclips[slot], self.clip_properties)
+                del self.slotclips[slot]
+            self.anchors.stop(tid, cid)
+            self.oscEndpoint.forgetState('/live/name/clip', (tid, cid))
+            
+            self.oscEndpoint.sendCoalesced('/live/track/info', (tid, armed, cid, 0, 0.0), key = (tid, cid))
+            self.oscEndpoint.sendCoalesced('/live/clip/info', (tid, cid, 0), 2)
                 
         #log("Slot changed" + str(self.clips[tid][cid]))
     
     def clip_changestate(self, clip, x, y):
         log("Listener: x: " + str(x) + " y: " + str(y));
+        self.mirror.updateClip(x, y, clip)
 
         playing = 1
         
@@ -738,167 +766,136 @@ class LiveOSC:
         if clip.is_triggered == 1:
             playing = 3
             
-        self.oscEndpoint.send('/live/clip/info', (x, y, playing))
+        self.oscEndpoint.sendCoalesced('/live/clip/info', (x, y, playing), 2)
+        if self.config.enabled("positions"):
+            if clip.is_playing == 1:
+                self.clip_position(clip, x, y)
+            else:
+                self.anchors.stop(x, y)
         
         #log("Clip changed x:" + str(x) + " y:" + str(y) + " status:" + str(playing)) 
         
         
     # Mixer Callbacks
-    def mixerv_changestate(self, type, tid, track, r = 0):
-        val = eval("track.mixer_device." + type + ".value")
-        types = { "panning": "pan", "volume": "volume", "crossfader": "crossfader" }
+    def mixerv_changestate(self, type, tid, track, param, r = 0):
+        val = float(param.value)
+        self.mirror_track(track, type, val)
+        name = self.mixer_addresses[type]
         
         if r == 2:
-            self.oscEndpoint.send('/live/master/' + types[type], (float(val)))
+            self.oscEndpoint.sendCoalesced('/live/master/' + name, (val))
         elif r == 1:
-            self.oscEndpoint.send('/live/return/' + types[type], (tid, float(val)))
+            self.oscEndpoint.sendCoalesced('/live/return/' + name, (tid, val), 1)
         else:
-            self.oscEndpoint.send('/live/' + types[type], (tid, float(val)))        
+            self.oscEndpoint.sendCoalesced('/live/' + name, (tid, val), 1)
         
-    def mixert_changestate(self, type, tid, track, r = 0):
-        val = eval("track." + type)
+    def mixert_changestate(self, type, tid, track, get, r = 0):
+        val = get(track)
+        self.mirror_track(track, type, int(val))
         
         if r == 1:
-            self.oscEndpoint.send('/live/return/' + type, (tid, int(val)))
+            self.oscEndpoint.sendCoalesced('/live/return/' + type, (tid, int(val)), 1)
         else:
-            self.oscEndpoint.send('/live/' + type, (tid, int(val)))        
+            self.oscEndpoint.sendCoalesced('/live/' + type, (tid, int(val)), 1)        
     
     def send_changestate(self, tid, track, sid, send, r = 0):
         val = send.value
+        record = self.mirror.record(track)
+        if record != None:
+            record.sends[sid] = float(val)
+            self.mirror.changed()
         
         if r == 1:
-            self.oscEndpoint.send('/live/return/send', (tid, sid, float(val)))   
+            self.oscEndpoint.sendCoalesced('/live/return/send', (tid, sid, float(val)), 2)
         else:
-            self.oscEndpoint.send('/live/send', (tid, sid, float(val)))   
+            self.oscEndpoint.sendCoalesced('/live/send', (tid, sid, float(val)), 2)
+
 
+    def mirror_track(self, track, name, value):
+        record = self.mirror.record(track)
+        if record != None:
+            setattr(record, name, value)
+            self.mirror.changed()
 
     # Track name changestate
     def trname_changestate(self, tid, track, r = 0):
+        self.mirror_track(track, 'name', str(track.name))
         if r == 1:
-            self.oscEndpoint.send('/live/name/return', (tid, str(track.name)))
+            self.oscEndpoint.sendCoalesced('/live/name/return', (tid, str(track.name)), 1)
         else:
-            self.oscEndpoint.send('/live/name/track', (tid, str(track.name)))
+            self.oscEndpoint.sendCoalesced('/live/name/track', (tid, str(track.name)), 1)
             self.trBlock(0, len(LiveUtils.getTracks()))
             
-    # Meter Changestate
-    def meter_changestate(self, tid, track, lr, r = 0):
-        if r == 2:
-            if self.check_md(2):
-                if lr == 0:
-                    self.oscEndpoint.send('/live/master/meter', (0, float(track.output_meter_left)))
-                else:
-                    self.oscEndpoint.send('/live/master/meter', (1, float(track.output_meter_right)))
-        elif r == 1:
-            if self.check_md(3):
-                if lr == 0:
-                    self.oscEndpoint.send('/live/return/meter', (tid, 0, float(track.output_meter_left)))
-                else:
-                    self.oscEndpoint.send('/live/return/meter', (tid, 1, float(track.output_meter_right)))        
-        else:
-            if self.check_md(4):
-                if lr == 0:
-                    self.oscEndpoint.send('/live/track/meter', (tid, 0, float(track.output_meter_left)))
-                else:
-                    self.oscEndpoint.send('/live/track/meter', (tid, 1, float(track.output_meter_right)))
-    
-    def check_md(self, param):
-        devices = self.song().master_track.devices
-        
-        if len(devices) > 0:
-            if devices[0].parameters[param].value > 0:
-                return 1
-            else:
-                return 0
-        else:
-            return 0
-    
+    # Output Meters
+    def sample_meters(self):
+        if not self.config.enabled("meters") or not self.oscEndpoint.wants('/live/meters'):
+            return
+        self.meters.sample(LiveUtils.getTracks(), LiveUtils.getReturnTracks(), LiveUtils.getSong().master_track)
+
+    def poll_positions(self):
+        """Checks the playhead and loop of the playing clip of each track against its anchor, called once per tick
+        instead of listening to the playing position and loop of every clip"""
+        if not self.config.enabled("positions") or not self.oscEndpoint.wants('/live/clip/anchor'):
+            return
+        song = LiveUtils.getSong()
+        songTime = song.current_song_time
+        tempo = song.tempo
+        tracks = LiveUtils.getTracks()
+        for tid in self.slotIndices.keys():
+            cid = self.slotIndices[tid][0]
+            if cid < 0 or tid >= len(tracks):
+                continue
+            slots = tracks[tid].clip_slots
+            if cid >= len(slots):
+                # A scene was deleted since the last refresh
+                continue
+            clip = slots[cid].clip
+            if clip != None and clip.is_playing:
+                self.anchors.update(tid, cid, clip, songTime, tempo)
+
+    def correct_anchors(self):
+        if not self.config.enabled("positions") or not self.config.enabled("corrections"):
+            return
+        if self.oscEndpoint.wants('/live/clip/anchor'):
+            self.anchors.resend(LiveUtils.getSong(), 1)
+
     # Device Listeners
     def add_device_listeners(self):
-        self.rem_device_listeners()
-    
         self.do_add_device_listeners(self.song().tracks,0)
         self.do_add_device_listeners(self.song().return_tracks,1)
         self.do_add_device_listeners([self.song().master_track],2)
             
     def do_add_device_listeners(self, tracks, type):
         for i in range(len(tracks)):
-            self.add_devicelistener(tracks[i], i, type)
-        
-            if len(tracks[i].devices) >= 1:
-                for j in range(len(tracks[i].devices)):
-                    self.add_devpmlistener(tracks[i].devices[j])
-                
-                    if len(tracks[i].devices[j].parameters) >= 1:
-                        for k in range (len(tracks[i].devices[j].parameters)):
-                            par = tracks[i].devices[j].parameters[k]
-                            self.add_paramlistener(par, i, j, k, type)
-            
-    def rem_device_listeners(self):
-        for pr in self.prlisten:
-            ocb = self.prlisten[pr]
-            if pr != None:
-                if pr.value_has_listener(ocb) == 1:
-                    pr.remove_value_listener(ocb)
+            track = tracks[i]
+            self.add_devicelistener(track, i, type)
         
-        self.prlisten = {}
-        
-        for tr in self.dlisten:
-            ocb = self.dlisten[tr]
-            if tr != None:
-                if tr.view.selected_device_has_listener(ocb) == 1:
-                    tr.view.remove_selected_device_listener(ocb)
-                    
-        self.dlisten = {}
-        
-        for de in self.plisten:
-            ocb = self.plisten[de]
-            if de != None:
-                if de.parameters_has_listener(ocb) == 1:
-                    de.remove_parameters_listener(ocb)
-                    
-        self.plisten = {}
-
-    def add_devpmlistener(self, device):
-        cb = lambda :self.devpm_change()
-        
-        if self.plisten.has_key(device) != 1:
-            device.add_parameters_listener(cb)
-            self.plisten[device] = cb
+            # Parameter values are only listened to for the banks that
+            # clients select, see LiveOSCCallbacks.deviceBankSelectCB()
+            for device in track.devices:
+                self.add_devpmlistener(track, device)
+                self.listeners.want(device, "name", self.mirror.updateDevice, (track, device))
+
+    def add_devpmlistener(self, track, device):
+        self.listeners.want(device, "parameters", self.devpm_change, (track,))
     
-    def devpm_change(self):
-        self.refresh_state()
-        
-    def add_paramlistener(self, param, tid, did, pid, type):
-        cb = lambda :self.param_changestate(param, tid, did, pid, type)
-        
-        if self.prlisten.has_key(param) != 1:
-            param.add_value_listener(cb)
-            self.prlisten[param] = cb
-            
-    def param_changestate(self, param, tid, did, pid, type):
-        if type == 2:
-            self.oscEndpoint.send('/live/master/device/param', (did, pid, param.value, str(param.name)))
-        elif type == 1:
-            self.oscEndpoint.send('/live/return/device/param', (tid, did, pid, param.value, str(param.name)))
-        else:
-            self.oscEndpoint.send('/live/device/param', (tid, did, pid, param.value, str(param.name)))
+    def devpm_change(self, track):
+        self.mirror.invalidate(track)
+        self.request_refresh()
         
     def add_devicelistener(self, track, tid, type):
-        cb = lambda :self.device_changestate(track, tid, type)
-        
-        if self.dlisten.has_key(track) != 1:
-            track.view.add_selected_device_listener(cb)
-            self.dlisten[track] = cb
+        self.listeners.want(track, "view.selected_device", self.device_changestate, (track, tid, type))
+        self.listeners.want(track, "devices", self.devpm_change, (track,))
         
     def device_changestate(self, track, tid, type):
         did = self.tuple_idx(track.devices, track.view.selected_device)
         
         if type == 2:
-            self.oscEndpoint.send('/live/master/devices/selected', (did))
+            self.oscEndpoint.sendCoalesced('/live/master/devices/selected', (did))
         elif type == 1:
-            self.oscEndpoint.send('/live/return/device/selected', (tid, did))
+            self.oscEndpoint.sendCoalesced('/live/return/device/selected', (tid, did), 1)
         else:
-            self.oscEndpoint.send('/live/device/selected', (tid, did))        
+            self.oscEndpoint.sendCoalesced('/live/device/selected', (tid, did), 1)        
         
     def tuple_idx(self, tuple, obj):
         for i in xrange(0,len(tuple)):
@@ -18,183 +18,560 @@
 # For questions regarding this module contact
 # Rob King <rob@e-mu.org> or visit http://www.e-mu.org
 
-This file contains all the current Live OSC callbacks. 
+This file contains all the current Live OSC callbacks.
+
+The callbacks are registered from the ROUTES table below.  Each route
+names an OSC address, the typetag signature of the messages it accepts,
+the kind of track it works on (or None) and the name of the handler
+method.  Signatures use the OSC typetags plus "n" for a number that may
+be sent as int or float, "x" for an integer, such as an index, that may
+be sent as int or float and is passed on as int, and "*" for messages
+with any arguments.
+Messages whose typetags match no route of their address are rejected by
+the callback manager before any handler runs, so the handlers do not
+need to check their arguments.  Handlers that have a track kind are
+called with it as additional argument.
+
+Queries for values that LiveOSC listens to are answered from the
+LiveMirror passed to the constructor, once it has been built, and read
+Live otherwise.  Writes always go to Live.
 
 """
 import Live
 import RemixNet
 import OSC
 import LiveUtils
+import LiveMirror
+import LiveWatch
+import LiveConfig
 import sys
+import struct
 
 from Logger import log
 
+TRACK = LiveUtils.TRACK
+RETURN = LiveUtils.RETURN
+MASTER = LiveUtils.MASTER
+
+ROUTES = (
+    ("/live/tempo",                 ",",        None,   "tempoCB"),
+    ("/live/tempo",                 ",s",       None,   "tempoCB"),
+    ("/live/tempo",                 ",n",       None,   "setTempoCB"),
+    ("/live/time",                  ",",        None,   "timeCB"),
+    ("/live/time",                  ",s",       None,   "timeCB"),
+    ("/live/time",                  ",n",       None,   "setTimeCB"),
+    ("/live/next/cue",              "*",        None,   "nextCueCB"),
+    ("/live/prev/cue",              "*",        None,   "prevCueCB"),
+    ("/live/play",                  "*",        None,   "playCB"),
+    ("/live/play/continue",         "*",        None,   "playContinueCB"),
+    ("/live/play/selection",        "*",        None,   "playSelectionCB"),
+    ("/live/play/clip",             ",xx",      None,   "playClipCB"),
+    ("/live/play/clipslot",         ",xx",      None,   "playClipSlotCB"),
+    ("/live/play/scene",            ",x",       None,   "playSceneCB"),
+    ("/live/stop",                  "*",        None,   "stopCB"),
+    ("/live/stop/clip",             ",xx",      None,   "stopClipCB"),
+    ("/live/stop/track",            ",x",       None,   "stopTrackCB"),
+    ("/live/undo",                  "*",        None,   "undoCB"),
+    ("/live/redo",                  "*",        None,   "redoCB"),
+    ("/live/overdub",               ",n",       None,   "overdubCB"),
+    ("/live/state",                 ",",        None,   "stateCB"),
+    ("/live/state",                 ",s",       None,   "stateCB"),
+    ("/live/quantization",          ",x",       None,   "quantizationCB"),
+    ("/live/selection",             ",xxxx",    None,   "selectionCB"),
+    ("/live/snapshot",              ",",        None,   "snapshotCB"),
+    ("/live/snapshot",              ",x",       None,   "snapshotCB"),
+    ("/live/grid",                  ",xxxx",    None,   "gridCB"),
+    ("/live/grid/subscribe",        ",xxxx",    None,   "gridSubscribeCB"),
+    ("/live/grid/subscribe",        ",xxxxx",   None,   "gridSubscribeCB"),
+    ("/live/grid/unsubscribe",      ",",        None,   "gridUnsubscribeCB"),
+    ("/live/grid/unsubscribe",      ",x",       None,   "gridUnsubscribeCB"),
+    ("/live/watch",                 ",s",       None,   "watchCB"),
+    ("/live/watch",                 ",sx",      None,   "watchCB"),
+    ("/live/unwatch",               ",",        None,   "unwatchCB"),
+    ("/live/unwatch",               ",s",       None,   "unwatchCB"),
+    ("/live/unwatch",               ",sx",      None,   "unwatchCB"),
+    ("/remix/config",               ",",        None,   "configCB"),
+    ("/remix/config",               ",s",       None,   "configCB"),
+    ("/remix/config",               ",sx",      None,   "setConfigCB"),
+
+    ("/live/scenes",                ",",        None,   "scenesCB"),
+    ("/live/scenes",                ",s",       None,   "scenesCB"),
+    ("/live/tracks",                ",",        None,   "tracksCB"),
+    ("/live/tracks",                ",s",       None,   "tracksCB"),
+    ("/live/scene",                 ",",        None,   "sceneCB"),
+    ("/live/scene",                 ",s",       None,   "sceneCB"),
+    ("/live/scene",                 ",x",       None,   "selectSceneCB"),
+
+    ("/live/name/scene",            ",",        None,   "nameScenesCB"),
+    ("/live/name/scene",            ",s",       None,   "nameScenesCB"),
+    ("/live/name/scene",            ",x",       None,   "nameSceneCB"),
+    ("/live/name/scene",            ",xs",      None,   "renameSceneCB"),
+    ("/live/name/sceneblock",       ",xx",      None,   "nameSceneBlockCB"),
+    ("/live/name/track",            ",",        None,   "nameTracksCB"),
+    ("/live/name/track",            ",s",       None,   "nameTracksCB"),
+    ("/live/name/track",            ",x",       None,   "nameTrackCB"),
+    ("/live/name/track",            ",xs",      None,   "renameTrackCB"),
+    ("/live/name/trackblock",       ",xx",      None,   "nameTrackBlockCB"),
+    ("/live/name/clip",             ",",        None,   "nameClipsCB"),
+    ("/live/name/clip",             ",s",       None,   "nameClipsCB"),
+    ("/live/name/clip",             ",xx",      None,   "nameClipCB"),
+    ("/live/name/clip",             ",xxs",     None,   "renameClipCB"),
+    ("/live/name/clip",             ",xxsx",    None,   "renameClipCB"),
+    ("/live/name/clipblock",        ",xxxx",    None,   "nameClipBlockCB"),
+
+    ("/live/arm",                   ",x",       TRACK,  "armTrackCB"),
+    ("/live/arm",                   ",xn",      TRACK,  "setArmTrackCB"),
+    ("/live/mute",                  ",x",       TRACK,  "muteTrackCB"),
+    ("/live/mute",                  ",xn",      TRACK,  "setMuteTrackCB"),
+    ("/live/return/mute",           ",x",       RETURN, "muteTrackCB"),
+    ("/live/return/mute",           ",xn",      RETURN, "setMuteTrackCB"),
+    ("/live/solo",                  ",x",       TRACK,  "soloTrackCB"),
+    ("/live/solo",                  ",xn",      TRACK,  "setSoloTrackCB"),
+    ("/live/return/solo",           ",x",       RETURN, "soloTrackCB"),
+    ("/live/return/solo",           ",xn",      RETURN, "setSoloTrackCB"),
+
+    ("/live/volume",                ",x",       TRACK,  "volumeCB"),
+    ("/live/volume",                ",xn",      TRACK,  "setVolumeCB"),
+    ("/live/return/volume",         ",x",       RETURN, "volumeCB"),
+    ("/live/return/volume",         ",xn",      RETURN, "setVolumeCB"),
+    ("/live/master/volume",         ",",        MASTER, "volumeCB"),
+    ("/live/master/volume",         ",n",       MASTER, "setVolumeCB"),
+    ("/live/pan",                   ",x",       TRACK,  "panCB"),
+    ("/live/pan",                   ",xn",      TRACK,  "setPanCB"),
+    ("/live/return/pan",            ",x",       RETURN, "panCB"),
+    ("/live/return/pan",            ",xn",      RETURN, "setPanCB"),
+    ("/live/master/pan",            ",",        MASTER, "panCB"),
+    ("/live/master/pan",            ",n",       MASTER, "setPanCB"),
+    ("/live/send",                  ",x",       TRACK,  "sendsCB"),
+    ("/live/send",                  ",xx",      TRACK,  "sendCB"),
+    ("/live/send",                  ",xxn",     TRACK,  "setSendCB"),
+    ("/live/return/send",           ",x",       RETURN, "sendsCB"),
+    ("/live/return/send",           ",xx",      RETURN, "sendCB"),
+    ("/live/return/send",           ",xxn",     RETURN, "setSendCB"),
+    ("/live/master/crossfader",     ",",        None,   "crossfaderCB"),
+    ("/live/master/crossfader",     ",s",       None,   "crossfaderCB"),
+    ("/live/master/crossfader",     ",n",       None,   "setCrossfaderCB"),
+    ("/live/track/crossfader",      ",x",       TRACK,  "trackxfaderCB"),
+    ("/live/track/crossfader",      ",xx",      TRACK,  "setTrackxfaderCB"),
+    ("/live/return/crossfader",     ",x",       RETURN, "trackxfaderCB"),
+    ("/live/return/crossfader",     ",xx",      RETURN, "setTrackxfaderCB"),
+
+    ("/live/track/jump",            ",xn",      None,   "trackJump"),
+    ("/live/track/info",            ",",        None,   "trackInfoCB"),
+    ("/live/track/info",            ",x",       None,   "trackInfoCB"),
+
+    ("/live/scene/view",            ",x",       None,   "viewSceneCB"),
+    ("/live/track/view",            ",x",       TRACK,  "viewTrackCB"),
+    ("/live/return/view",           ",x",       RETURN, "viewTrackCB"),
+    ("/live/master/view",           "*",        MASTER, "viewTrackCB"),
+    ("/live/track/device/view",     ",xx",      TRACK,  "viewDeviceCB"),
+    ("/live/return/device/view",    ",xx",      RETURN, "viewDeviceCB"),
+    ("/live/master/device/view",    ",x",       MASTER, "viewDeviceCB"),
+    ("/live/clip/view",             ",x",       None,   "viewClipCB"),
+    ("/live/clip/view",             ",xx",      None,   "viewClipCB"),
+    ("/live/detail/view",           ",x",       None,   "detailViewCB"),
+
+    ("/live/devicelist",            ",x",       TRACK,  "devicelistCB"),
+    ("/live/return/devicelist",     ",x",       RETURN, "devicelistCB"),
+    ("/live/master/devicelist",     ",",        MASTER, "devicelistCB"),
+    ("/live/master/devicelist",     ",s",       MASTER, "devicelistCB"),
+    ("/live/device",                ",xx",      TRACK,  "deviceCB"),
+    ("/live/device",                ",xxx",     TRACK,  "deviceParamCB"),
+    ("/live/device",                ",xxxn",    TRACK,  "setDeviceParamCB"),
+    ("/live/return/device",         ",xx",      RETURN, "deviceCB"),
+    ("/live/return/device",         ",xxx",     RETURN, "deviceParamCB"),
+    ("/live/return/device",         ",xxxn",    RETURN, "setDeviceParamCB"),
+    ("/live/master/device",         ",x",       MASTER, "deviceCB"),
+    ("/live/master/device",         ",xx",      MASTER, "deviceParamCB"),
+    ("/live/master/device",         ",xxn",     MASTER, "setDeviceParamCB"),
+    ("/live/device/range",          ",xx",      TRACK,  "devicerangeCB"),
+    ("/live/device/range",          ",xxx",     TRACK,  "deviceParamRangeCB"),
+    ("/live/return/device/range",   ",xx",      RETURN, "devicerangeCB"),
+    ("/live/return/device/range",   ",xxx",     RETURN, "deviceParamRangeCB"),
+    ("/live/master/device/range",   ",x",       MASTER, "devicerangeCB"),
+    ("/live/master/device/range",   ",xx",      MASTER, "deviceParamRangeCB"),
+    ("/live/device/bank",           ",xxx",     TRACK,  "deviceBankCB"),
+    ("/live/device/bank",           ",xxxx",    TRACK,  "deviceBankCB"),
+    ("/live/return/device/bank",    ",xxx",     RETURN, "deviceBankCB"),
+    ("/live/return/device/bank",    ",xxxx",    RETURN, "deviceBankCB"),
+    ("/live/master/device/bank",    ",xx",      MASTER, "deviceBankCB"),
+    ("/live/master/device/bank",    ",xxx",     MASTER, "deviceBankCB"),
+    ("/live/device/bank/select",        ",xxx",     TRACK,  "deviceBankSelectCB"),
+    ("/live/device/bank/select",        ",xxxx",    TRACK,  "deviceBankSelectCB"),
+    ("/live/device/bank/select",        ",xxxxx",   TRACK,  "deviceBankSelectCB"),
+    ("/live/return/device/bank/select", ",xxx",     RETURN, "deviceBankSelectCB"),
+    ("/live/return/device/bank/select", ",xxxx",    RETURN, "deviceBankSelectCB"),
+    ("/live/return/device/bank/select", ",xxxxx",   RETURN, "deviceBankSelectCB"),
+    ("/live/master/device/bank/select", ",xx",      MASTER, "deviceBankSelectCB"),
+    ("/live/master/device/bank/select", ",xxx",     MASTER, "deviceBankSelectCB"),
+    ("/live/master/device/bank/select", ",xxxx",    MASTER, "deviceBankSelectCB"),
+
+    ("/live/clip/info",             ",xx",      None,   "clipInfoCB"),
+    ("/live/pitch",                 ",xx",      None,   "pitchCB"),
+    ("/live/pitch",                 ",xxxx",    None,   "setPitchCB"),
+    ("/live/clip/loopstate",        ",xx",      None,   "loopStateCB"),
+    ("/live/clip/loopstate",        ",xxn",     None,   "setLoopStateCB"),
+    ("/live/clip/loopstate_id",     ",xx",      None,   "loopStateIdCB"),
+    ("/live/clip/loopstate_id",     ",xxn",     None,   "setLoopStateCB"),
+    ("/live/clip/loopstart",        ",xx",      None,   "loopStartCB"),
+    ("/live/clip/loopstart",        ",xxn",     None,   "setLoopStartCB"),
+    ("/live/clip/loopstart_id",     ",xx",      None,   "loopStartIdCB"),
+    ("/live/clip/loopstart_id",     ",xxn",     None,   "setLoopStartCB"),
+    ("/live/clip/loopend",          ",xx",      None,   "loopEndCB"),
+    ("/live/clip/loopend",          ",xxn",     None,   "setLoopEndCB"),
+    ("/live/clip/loopend_id",       ",xx",      None,   "loopEndIdCB"),
+    ("/live/clip/loopend_id",       ",xxn",     None,   "setLoopEndCB"),
+    ("/live/clip/warping",          ",xx",      None,   "warpingCB"),
+    ("/live/clip/warping",          ",xxn",     None,   "setWarpingCB"),
+    ("/live/clip/signature",        ",xx",      None,   "sigCB"),
+    ("/live/clip/signature",        ",xxxx",    None,   "setSigCB"),
+    ("/live/clip/add_note",         ",xxxnnnn", None,   "addNoteCB"),
+    ("/live/clip/notes",            ",xx",      None,   "getNotesCB"),
+)
+
+def describeRoutes():
+    """Returns a list of lines describing the ROUTES table, one per
+    route, for generating API documentation and test messages."""
+    lines = []
+    for address, typetags, kind, handler in ROUTES:
+        lines.append("%-28s %-10s %s" % (address, typetags, handler))
+    return lines
+
 class LiveOSCCallbacks:
-    def __init__(self, c_instance, oscEndpoint):
+    def __init__(self, c_instance, oscEndpoint, mirror = None, config = None):
         self.oscEndpoint = oscEndpoint
         self.callbackManager = oscEndpoint.callbackManager
+        self.mirror = mirror
+        if config == None:
+            config = LiveConfig.LiveConfig()
+        self.config = config
+
+        # The grid window each peer subscribed to with
+        # /live/grid/subscribe, indexed by the peer's address, as
+        # [track, scene, width, height, cells last sent]
+        self.grids = {}
+
+        # The properties the peers watch with /live/watch, and the
+        # path of the parameter bank each peer selected on a device,
+        # indexed by the peer address, track path and device number
+        self.watches = LiveWatch.LiveWatches(oscEndpoint, config)
+        self.banks = {}
 
         self.c_instance = c_instance
 
-        self.callbackManager.add("/live/tempo", self.tempoCB)
-        self.callbackManager.add("/live/time", self.timeCB)
-        self.callbackManager.add("/live/next/cue", self.nextCueCB)
-        self.callbackManager.add("/live/prev/cue", self.prevCueCB)
-        self.callbackManager.add("/live/play", self.playCB)
-        self.callbackManager.add("/live/play/continue", self.playContinueCB)
-        self.callbackManager.add("/live/play/selection", self.playSelectionCB)
-        self.callbackManager.add("/live/play/clip", self.playClipCB)
-        self.callbackManager.add("/live/play/scene", self.playSceneCB)  
-        self.callbackManager.add("/live/stop", self.stopCB)
-        self.callbackManager.add("/live/stop/clip", self.stopClipCB)
-        self.callbackManager.add("/live/stop/track", self.stopTrackCB)
-        self.callbackManager.add("/live/scenes", self.scenesCB)
-        self.callbackManager.add("/live/tracks", self.tracksCB)
-        self.callbackManager.add("/live/name/scene", self.nameSceneCB)
-        self.callbackManager.add("/live/scene", self.sceneCB)
-        self.callbackManager.add("/live/name/sceneblock", self.nameSceneBlockCB)
-        self.callbackManager.add("/live/name/track", self.nameTrackCB)
-        self.callbackManager.add("/live/name/trackblock", self.nameTrackBlockCB)
-        self.callbackManager.add("/live/name/clip", self.nameClipCB)
-        self.callbackManager.add("/live/name/clipblock", self.nameClipBlockCB)    
-        self.callbackManager.add("/live/arm", self.armTrackCB)
-        self.callbackManager.add("/live/mute", self.muteTrackCB)
-        self.callbackManager.add("/live/solo", self.soloTrackCB)
-        self.callbackManager.add("/live/volume", self.volumeCB)
-        self.callbackManager.add("/live/pan", self.panCB)
-        self.callbackManager.add("/live/send", self.sendCB)
-        self.callbackManager.add("/live/pitch", self.pitchCB)
-        self.callbackManager.add("/live/track/jump", self.trackJump)
-        self.callbackManager.add("/live/track/info", self.trackInfoCB)
-        self.callbackManager.add("/live/undo", self.undoCB)
-        self.callbackManager.add("/live/redo", self.redoCB)
-        self.callbackManager.add("/live/play/clipslot", self.playClipSlotCB)
-        
-        self.callbackManager.add("/live/scene/view", self.viewSceneCB)
-        
-        self.callbackManager.add("/live/track/view", self.viewTrackCB)
-        self.callbackManager.add("/live/return/view", self.viewTrackCB)
-        self.callbackManager.add("/live/master/view", self.mviewTrackCB)
-        
-        self.callbackManager.add("/live/track/device/view", self.viewDeviceCB)
-        self.callbackManager.add("/live/return/device/view", self.viewDeviceCB)
-        self.callbackManager.add("/live/master/device/view", self.mviewDeviceCB)        
-        
-        self.callbackManager.add("/live/clip/view", self.viewClipCB)
-        
-        self.callbackManager.add("/live/detail/view", self.detailViewCB)
-        
-        self.callbackManager.add("/live/overdub", self.overdubCB)
-        self.callbackManager.add("/live/state", self.stateCB)
-        self.callbackManager.add("/live/clip/info", self.clipInfoCB)
-        
-        self.callbackManager.add("/live/return/mute", self.muteTrackCB)
-        self.callbackManager.add("/live/return/solo", self.soloTrackCB)
-        self.callbackManager.add("/live/return/volume", self.volumeCB)
-        self.callbackManager.add("/live/return/pan", self.panCB)
-        self.callbackManager.add("/live/return/send", self.sendCB)        
-
-        self.callbackManager.add("/live/master/volume", self.volumeCB)
-        self.callbackManager.add("/live/master/pan", self.panCB)
-        
-        self.callbackManager.add("/live/devicelist", self.devicelistCB)
-        self.callbackManager.add("/live/return/devicelist", self.devicelistCB)
-        self.callbackManager.add("/live/master/devicelist", self.mdevicelistCB)
-
-        self.callbackManager.add("/live/device/range", self.devicerangeCB)
-        self.callbackManager.add("/live/return/device/range", self.devicerangeCB)
-        self.callbackManager.add("/live/master/device/range", self.mdevicerangeCB)
-        
-        self.callbackManager.add("/live/device", self.deviceCB)
-        self.callbackManager.add("/live/return/device", self.deviceCB)
-        self.callbackManager.add("/live/master/device", self.mdeviceCB)
-        
-        self.callbackManager.add("/live/clip/loopstate", self.loopStateCB)
-        self.callbackManager.add("/live/clip/loopstart", self.loopStartCB)
-        self.callbackManager.add("/live/clip/loopend", self.loopEndCB)
-        
-        self.callbackManager.add("/live/clip/loopstate_id", self.loopStateCB)
-        self.callbackManager.add("/live/clip/loopstart_id", self.loopStartCB)
-        self.callbackManager.add("/live/clip/loopend_id", self.loopEndCB)
-        
-        self.callbackManager.add("/live/clip/warping", self.warpingCB)
-        
-        self.callbackManager.add("/live/clip/signature", self.sigCB)
-
-        self.callbackManager.add("/live/clip/add_note", self.addNoteCB)
-        self.callbackManager.add("/live/clip/notes", self.getNotesCB)
-
-        self.callbackManager.add("/live/master/crossfader", self.crossfaderCB)
-        self.callbackManager.add("/live/track/crossfader", self.trackxfaderCB)
-        self.callbackManager.add("/live/return/crossfader", self.trackxfaderCB)
-
-        self.callbackManager.add("/live/quantization", self.quantizationCB)
-
-        self.callbackManager.add("/live/selection", self.selectionCB)
+        for address, typetags, kind, handler in ROUTES:
+            callback = getattr(self, handler)
+            if kind != None:
+                callback = self.bindKind(callback, kind)
+            self.callbackManager.addRoute(address, typetags, callback)
+
+    def bindKind(self, callback, kind):
+        return lambda msg, source: callback(msg, source, kind)
+
+    def mirrored(self):
+        """Returns the mirror if queries can be answered from it, None otherwise"""
+        if self.mirror != None and self.mirror.ready and not self.mirror.stale:
+            return self.mirror
+        return None
+
+    def namedMirror(self):
+        """Returns the mirror if queries for names and colours can be answered from it, None otherwise"""
+        mirror = self.mirrored()
+        if mirror != None and mirror.names:
+            return mirror
+        return None
+
+    def trackValue(self, kind, num, name):
+        """Returns the property (name) of a track, return track or the master track"""
+        if name == "name":
+            mirror = self.namedMirror()
+        else:
+            mirror = self.mirrored()
+        if mirror != None:
+            return getattr(mirror.track(kind, num), name)
+        return getattr(LiveUtils.getAnyTrack(kind, num), name)
+
+    def mixerValue(self, kind, num, name):
+        """Returns the value of the mixer parameter (name) of a track, return track or the master track"""
+        mirror = self.mirrored()
+        if mirror != None:
+            return getattr(mirror.track(kind, num), name)
+        return float(getattr(LiveUtils.getAnyTrack(kind, num).mixer_device, name).value)
+
+    def sendValues(self, kind, track):
+        """Returns the list of send levels of a track or return track"""
+        mirror = self.mirrored()
+        if mirror != None:
+            return mirror.track(kind, track).sends
+        sends = []
+        for send in LiveUtils.getAnyTrack(kind, track).mixer_device.sends:
+            sends.append(float(send.value))
+        return sends
+
+    def trackClips(self, names = 0):
+        """Returns a list with the list of clips, or their mirror records, of each track, with their names and colours if (names) is true"""
+        if names:
+            mirror = self.namedMirror()
+        else:
+            mirror = self.mirrored()
+        if mirror != None:
+            clips = []
+            for track in mirror.tracks:
+                clips.append(track.clips)
+            return clips
+        return LiveUtils.getClips()
+
+    def getClip(self, track, clip, names = 0):
+        """Returns the clip, or its mirror record, number (clip) in track (track), with its name and colour if (names) is true"""
+        if names:
+            mirror = self.namedMirror()
+        else:
+            mirror = self.mirrored()
+        if mirror != None:
+            return mirror.clip(track, clip)
+        return LiveUtils.getClip(track, clip)
+
+    def getDevice(self, kind, track, device):
+        """Returns the mirror record of device number (device) of a track, read from Live if there is no mirror"""
+        mirror = self.mirrored()
+        if mirror != None:
+            devices = mirror.track(kind, track).devices
+        else:
+            devices = LiveUtils.getAnyTrack(kind, track).devices
+        LiveUtils.checkRange('device', device, 1, len(devices))
+        if mirror != None:
+            return devices[device]
+        return LiveMirror.DeviceRecord(devices[device])
 
     def sigCB(self, msg, source):
         """ Called when a /live/clip/signature message is recieved
         """
         track = msg[2]
         clip = msg[3]
-        c = LiveUtils.getSong().visible_tracks[track].clip_slots[clip].clip
-        
-        if len(msg) == 4:
-            self.oscEndpoint.send("/live/clip/signature", (track, clip, c.signature_numerator, c.signature_denominator))
-            
-        if len(msg) == 6:
-            self.oscEndpoint.send("/live/clip/signature", 1)
-            c.signature_denominator = msg[5]
-            c.signature_numerator = msg[4]
+        c = LiveUtils.getClip(track, clip)
+        self.oscEndpoint.send("/live/clip/signature", (track, clip, c.signature_numerator, c.signature_denominator))
+
+    def setSigCB(self, msg, source):
+        c = LiveUtils.getClip(msg[2], msg[3])
+        self.oscEndpoint.send("/live/clip/signature", 1)
+        c.signature_denominator = msg[5]
+        c.signature_numerator = msg[4]
 
     def warpingCB(self, msg, source):
         """ Called when a /live/clip/warping message is recieved
         """
         track = msg[2]
         clip = msg[3]
-        
-        
-        if len(msg) == 4:
-            state = LiveUtils.getSong().visible_tracks[track].clip_slots[clip].clip.warping
-            self.oscEndpoint.send("/live/clip/warping", (track, clip, int(state)))
-        
-        elif len(msg) == 5:
-            LiveUtils.getSong().visible_tracks[track].clip_slots[clip].clip.warping = msg[4]
+        state = LiveUtils.getClip(track, clip).warping
+        self.oscEndpoint.send("/live/clip/warping", (track, clip, int(state)))
+
+    def setWarpingCB(self, msg, source):
+        LiveUtils.getClip(msg[2], msg[3]).warping = int(msg[4])
 
     def selectionCB(self, msg, source):
         """ Called when a /live/selection message is received
         """
-        if len(msg) == 6:
-            self.c_instance.set_session_highlight(msg[2], msg[3], msg[4], msg[5], 0)
+        self.c_instance.set_session_highlight(msg[2], msg[3], msg[4], msg[5], 0)
+
+    def gridCells(self, track, scene, width, height):
+        """Returns the packed grid state and colour of the clips in a window of the session, see LiveMirror.gridCell()
+
+        The clips are ordered by scene, then track.  Cells outside of the session are empty.
+        """
+        clips = self.trackClips()
+        colours = self.namedMirror() != None or self.mirrored() == None
+        cells = []
+        for s in range(scene, scene + height):
+            for t in range(track, track + width):
+                clip = None
+                if t >= 0 and t < len(clips) and s >= 0 and s < len(clips[t]):
+                    clip = clips[t][s]
+                    if clip != None and not colours:
+                        # The colours are not mirrored, only the clips
+                        # in the window are read from Live
+                        clip = LiveUtils.getClip(t, s)
+                cells.extend(LiveMirror.gridCell(clip))
+        return struct.pack(">%dB" % len(cells), *cells)
+
+    def checkGridWindow(self, width, height):
+        """Raises an exception unless a window of (width) x (height) clips fits into one datagram"""
+        if width < 0 or height < 0:
+            raise Exception("grid window of negative size " + str(width) + "x" + str(height))
+        # Two bytes per clip, the rest of the datagram is left for the
+        # address and the other arguments
+        cells = (self.oscEndpoint.maxPacketSize - 64) / 2
+        if width * height > cells:
+            raise Exception("grid window " + str(width) + "x" + str(height) + " larger than " + str(cells) + " clips")
+
+    def gridCB(self, msg, source):
+        """Called when a /live/grid message is received.
+
+        Messages:
+        /live/grid      (int track, int scene, int width, int height)   Returns the state and colour of the clips in the window as
+                                                                        /live/grid (int track, int scene, int width, int height, blob cells)
+        """
+        self.checkGridWindow(msg[4], msg[5])
+        message = OSC.OSCMessage("/live/grid", tuple(msg[2:6]))
+        message.append(self.gridCells(msg[2], msg[3], msg[4], msg[5]), 'b')
+        self.oscEndpoint.sendMessage(message)
+
+    def gridSubscribeCB(self, msg, source):
+        """Called when a /live/grid/subscribe message is received.
+
+        Messages:
+        /live/grid/subscribe    (int track, int scene, int width, int height, [int port])   Sends the grid window like /live/grid, then
+                                                                                            its changes on every tick
+        """
+        self.checkGridWindow(msg[4], msg[5])
+        for peer in self.oscEndpoint.findPeers(msg, source, 6):
+            cells = self.gridCells(msg[2], msg[3], msg[4], msg[5])
+            self.grids[peer.addr] = list(msg[2:6]) + [cells]
+            message = OSC.OSCMessage("/live/grid", tuple(msg[2:6]))
+            message.append(cells, 'b')
+            self.oscEndpoint.sendMessage(message, (peer,))
+
+    def gridUnsubscribeCB(self, msg, source):
+        for peer in self.oscEndpoint.findPeers(msg, source, 2):
+            if self.grids.has_key(peer.addr):
+                del self.grids[peer.addr]
+
+    def updateGrids(self):
+        """Sends the changes of the subscribed grid windows since they were last sent, called once per tick.
+
+        The changes are sent as /live/grid/diff (int track, int scene, int width, int height, blob changes), where
+        changes holds a 16 bit cell index, the state and the colour of each changed cell.  If more than a quarter
+        of the window changed, it is sent like /live/grid instead.
+        """
+        for addr in self.grids.keys():
+            if not self.oscEndpoint.peers.has_key(addr):
+                del self.grids[addr]
+                continue
+            try:
+                self.updateGrid(addr, self.grids[addr])
+            except Exception, e:
+                # The window no longer fits the song, or its tracks
+                # have been deleted, so it would fail on every tick
+                log("dropping grid window of " + str(addr) + ": " + str(e))
+                del self.grids[addr]
+
+    def updateGrid(self, addr, grid):
+        track, scene, width, height, last = grid
+        cells = self.gridCells(track, scene, width, height)
+        if cells == last:
+            return
+        grid[4] = cells
+
+        changes = []
+        for i in range(0, len(cells), 2):
+            if cells[i:i + 2] != last[i:i + 2]:
+                changes.append(struct.pack(">H", i / 2) + cells[i:i + 2])
+        if len(changes) * 4 > len(cells) / 2:
+            message = OSC.OSCMessage("/live/grid", (track, scene, width, height))
+            message.append(cells, 'b')
+        else:
+            message = OSC.OSCMessage("/live/grid/diff", (track, scene, width, height))
+            message.append("".join(changes), 'b')
+        self.oscEndpoint.sendMessage(message, (self.oscEndpoint.peers[addr],))
+
+    def updateWatches(self):
+        """Sends the changes of the watched properties, called once per tick"""
+        self.watches.update()
+        self.pruneBanks()
+
+    def rebindWatches(self):
+        """Resolves the watched properties again after the structure of the song changed"""
+        self.watches.rebind()
+        self.pruneBanks()
+
+    def pruneBanks(self):
+        """Forgets the selected parameter banks that are no longer watched, because their peer is gone,
+        their device no longer exists or the peer unwatched them"""
+        for key in self.banks.keys():
+            if not self.watches.requests.get(key[0], {}).has_key(self.banks[key]):
+                del self.banks[key]
+
+    def watchCB(self, msg, source):
+        """Called when a /live/watch message is received.
+
+        Messages:
+        /live/watch     (string path, [int port])   Sends the current value of the properties named by path, see LiveWatch,
+                                                    as /live/watch (string path, value), then their new values whenever they change
+        """
+        for peer in self.oscEndpoint.findPeers(msg, source, 3):
+            self.watches.watch(peer, msg[2])
+
+    def unwatchCB(self, msg, source):
+        """Called when a /live/unwatch message is received.
+
+        Messages:
+        /live/unwatch   ([string path], [int port]) Stops watching path, or all properties
+        """
+        path = None
+        if len(msg) > 2:
+            path = msg[2]
+        for peer in self.oscEndpoint.findPeers(msg, source, 3):
+            self.watches.unwatch(peer.addr, path)
+
+    def configCB(self, msg, source):
+        """Called when a /remix/config message is received.
+
+        Messages:
+        /remix/config                       Returns every feature gate as /remix/config (string name, int on)
+        /remix/config   (string name)       Returns the feature gate name as /remix/config (string name, int on)
+        /remix/config   (string name, int on)   Switches the feature gate name on or off, see LiveConfig
+        """
+        if len(msg) > 2:
+            names = [msg[2]]
+        else:
+            names = self.config.values.keys()
+            names.sort()
+        bundle = OSC.OSCBundle()
+        for name in names:
+            bundle.append("/remix/config", (name, self.config.enabled(name)))
+        self.oscEndpoint.sendMessage(bundle)
+
+    def setConfigCB(self, msg, source):
+        self.config.set(msg[2], msg[3])
 
-    def trackxfaderCB(self, msg, source):
+    def trackxfaderCB(self, msg, source, kind):
         """ Called when a /live/track/crossfader or /live/return/crossfader message is received
         """
-        ty = msg[0] == '/live/return/crossfader' and 1 or 0
-    
-        if len(msg) == 3:
-            track = msg[2]
-        
-            if ty == 1:
-                assign = LiveUtils.getSong().return_tracks[track].mixer_device.crossfade_assign
-                name   = LiveUtils.getSong().return_tracks[track].mixer_device.crossfade_assignments.values[assign]
-            
-                self.oscEndpoint.send("/live/return/crossfader", (track, str(assign), str(name)))
-            else:
-                assign = LiveUtils.getSong().visible_tracks[track].mixer_device.crossfade_assign
-                name   = LiveUtils.getSong().visible_tracks[track].mixer_device.crossfade_assignments.values[assign]
-            
-                self.oscEndpoint.send("/live/track/crossfader", (track, str(assign), str(name)))
+        track = msg[2]
+        mixer = LiveUtils.getAnyTrack(kind, track).mixer_device
+        assign = mixer.crossfade_assign
+        name   = mixer.crossfade_assignments.values[assign]
+        self.oscEndpoint.send(msg[0], (track, str(assign), str(name)))
 
-            
-        elif len(msg) == 4:
-            track = msg[2]
-            assign = msg[3]
-            
-            if ty == 1:
-                LiveUtils.getSong().return_tracks[track].mixer_device.crossfade_assign = assign
-            else:
-                LiveUtils.getSong().visible_tracks[track].mixer_device.crossfade_assign = assign
+    def setTrackxfaderCB(self, msg, source, kind):
+        LiveUtils.getAnyTrack(kind, msg[2]).mixer_device.crossfade_assign = msg[3]
+
+    def snapshotCB(self, msg, source):
+        """Called when a /live/snapshot message is received.
+
+        Messages:
+        /live/snapshot                  Returns the session packed into a blob, as /live/snapshot (int version, int part, int parts, blob data) messages
+        /live/snapshot  (int version)   Returns just /live/snapshot (int version) if the session has not changed since the snapshot with that version
+        """
+        mirror = self.mirrored()
+        if mirror != None:
+            version = mirror.version
+            if len(msg) == 3 and msg[2] == version:
+                self.oscEndpoint.send("/live/snapshot", version)
+                return
+        else:
+            # A snapshot read from Live while the mirror is being
+            # rebuilt has no version and is always sent in full
+            mirror = LiveMirror.LiveMirror()
+            mirror.rebuild(LiveUtils.getSong())
+            version = 0
+        blob = mirror.snapshot()
+
+        size = self.oscEndpoint.maxPacketSize - 64
+        parts = (len(blob) + size - 1) / size
+        for part in range(parts):
+            message = OSC.OSCMessage("/live/snapshot", (version, part, parts))
+            message.append(blob[part * size:(part + 1) * size], 'b')
+            self.oscEndpoint.sendMessage(message)
 
     def tempoCB(self, msg, source):
         """Called when a /live/tempo message is received.
@@ -203,13 +580,11 @@ class LiveOSCCallbacks:
         /live/tempo                 Request current tempo, replies with /live/tempo (float tempo)
         /live/tempo (float tempo)   Set the tempo, replies with /live/tempo (float tempo)
         """
-        if len(msg) == 2 or (len(msg) == 3 and msg[2] == "query"):
-            self.oscEndpoint.send("/live/tempo", LiveUtils.getTempo())
-        
-        elif len(msg) == 3:
-            tempo = msg[2]
-            LiveUtils.setTempo(tempo)
-        
+        self.oscEndpoint.send("/live/tempo", LiveUtils.getTempo())
+
+    def setTempoCB(self, msg, source):
+        LiveUtils.setTempo(float(msg[2]))
+
     def timeCB(self, msg, source):
         """Called when a /live/time message is received.
 
@@ -217,12 +592,10 @@ class LiveOSCCallbacks:
         /live/time                 Request current song time, replies with /live/time (float time)
         /live/time (float time)    Set the time , replies with /live/time (float time)
         """
-        if len(msg) == 2 or (len(msg) == 3 and msg[2] == "query"):
-            self.oscEndpoint.send("/live/time", float(LiveUtils.currentTime()))
+        self.oscEndpoint.send("/live/time", float(LiveUtils.currentTime()))
 
-        elif len(msg) == 3:
-            time = msg[2]
-            LiveUtils.currentTime(time)
+    def setTimeCB(self, msg, source):
+        LiveUtils.currentTime(float(msg[2]))
 
     def nextCueCB(self, msg, source):
         """Called when a /live/next/cue message is received.
@@ -231,7 +604,7 @@ class LiveOSCCallbacks:
         /live/next/cue              Jumps to the next cue point
         """
         LiveUtils.jumpToNextCue()
-        
+
     def prevCueCB(self, msg, source):
         """Called when a /live/prev/cue message is received.
 
@@ -239,7 +612,7 @@ class LiveOSCCallbacks:
         /live/prev/cue              Jumps to the previous cue point
         """
         LiveUtils.jumpToPrevCue()
-        
+
     def playCB(self, msg, source):
         """Called when a /live/play message is received.
 
@@ -247,7 +620,7 @@ class LiveOSCCallbacks:
         /live/play              Starts the song playing
         """
         LiveUtils.play()
-        
+
     def playContinueCB(self, msg, source):
         """Called when a /live/play/continue message is received.
 
@@ -255,7 +628,7 @@ class LiveOSCCallbacks:
         /live/play/continue     Continues playing the song from the current point
         """
         LiveUtils.continuePlaying()
-        
+
     def playSelectionCB(self, msg, source):
         """Called when a /live/play/selection message is received.
 
@@ -263,28 +636,23 @@ class LiveOSCCallbacks:
         /live/play/selection    Plays the current selection
         """
         LiveUtils.playSelection()
-        
+
     def playClipCB(self, msg, source):
         """Called when a /live/play/clip message is received.
 
         Messages:
         /live/play/clip     (int track, int clip)   Launches clip number clip in track number track
         """
-        if len(msg) == 4:
-            track = msg[2]
-            clip = msg[3]
-            LiveUtils.launchClip(track, clip)
-            
+        LiveUtils.launchClip(msg[2], msg[3])
+
     def playSceneCB(self, msg, source):
         """Called when a /live/play/scene message is received.
 
         Messages:
         /live/play/scene    (int scene)     Launches scene number scene
         """
-        if len(msg) == 3:
-            scene = msg[2]
-            LiveUtils.launchScene(scene)
-    
+        LiveUtils.launchScene(msg[2])
+
     def stopCB(self, msg, source):
         """Called when a /live/stop message is received.
 
@@ -292,17 +660,14 @@ class LiveOSCCallbacks:
         /live/stop              Stops playing the song
         """
         LiveUtils.stop()
-        
+
     def stopClipCB(self, msg, source):
         """Called when a /live/stop/clip message is received.
 
         Messages:
         /live/stop/clip     (int track, int clip)   Stops clip number clip in track number track
         """
-        if len(msg) == 4:
-            track = msg[2]
-            clip = msg[3]
-            LiveUtils.stopClip(track, clip)
+        LiveUtils.stopClip(msg[2], msg[3])
 
     def stopTrackCB(self, msg, source):
         """Called when a /live/stop/track message is received.
@@ -310,9 +675,7 @@ class LiveOSCCallbacks:
         Messages:
         /live/stop/track     (int track, int clip)   Stops track number track
         """
-        if len(msg) == 3:
-            track = msg[2]
-            LiveUtils.stopTrack(track)
+        LiveUtils.stopTrack(msg[2])
 
     def scenesCB(self, msg, source):
         """Called when a /live/scenes message is received.
@@ -321,32 +684,28 @@ class LiveOSCCallbacks:
         /live/scenes        no argument or 'query'  Returns the total number of scenes
 
         """
-        if len(msg) == 2 or (len(msg) == 3 and msg[2] == "query"):
-            sceneTotal = len(LiveUtils.getScenes())
-            self.oscEndpoint.send("/live/scenes", (sceneTotal))
-            return
+        sceneTotal = len(LiveUtils.getScenes())
+        self.oscEndpoint.send("/live/scenes", (sceneTotal))
 
     def sceneCB(self, msg, source):
         """Called when a /live/scene message is received.
-        
+
         Messages:
         /live/scene         no argument or 'query'  Returns the currently playing scene number
         """
-        if len(msg) == 2 or (len(msg) == 3 and msg[2] == "query"):
-            selected_scene = LiveUtils.getSong().view.selected_scene
-            scenes = LiveUtils.getScenes()
-            index = 0
-            selected_index = 0
-            for scene in scenes:
-                index = index + 1        
-                if scene == selected_scene:
-                    selected_index = index
-                    
-            self.oscEndpoint.send("/live/scene", (selected_index))
-            
-        elif len(msg) == 3:
-            scene = msg[2]
-            LiveUtils.getSong().view.selected_scene = LiveUtils.getSong().scenes[scene]
+        selected_scene = LiveUtils.getSong().view.selected_scene
+        scenes = LiveUtils.getScenes()
+        index = 0
+        selected_index = 0
+        for scene in scenes:
+            index = index + 1
+            if scene == selected_scene:
+                selected_index = index
+
+        self.oscEndpoint.send("/live/scene", (selected_index))
+
+    def selectSceneCB(self, msg, source):
+        LiveUtils.getSong().view.selected_scene = LiveUtils.getScene(msg[2])
 
     def tracksCB(self, msg, source):
         """Called when a /live/tracks message is received.
@@ -355,13 +714,10 @@ class LiveOSCCallbacks:
         /live/tracks       no argument or 'query'  Returns the total number of scenes
 
         """
-        if len(msg) == 2 or (len(msg) == 3 and msg[2] == "query"):
-            trackTotal = len(LiveUtils.getTracks())
-            self.oscEndpoint.send("/live/tracks", (trackTotal))
-            return
-
+        trackTotal = len(LiveUtils.getTracks())
+        self.oscEndpoint.send("/live/tracks", (trackTotal))
 
-    def nameSceneCB(self, msg, source):
+    def nameScenesCB(self, msg, source):
         """Called when a /live/name/scene message is received.
 
         Messages:
@@ -369,42 +725,34 @@ class LiveOSCCallbacks:
         /live/name/scene    (int scene)             Returns a single scene's name in the form /live/name/scene (int scene, string name)
         /live/name/scene    (int scene, string name)Sets scene number scene's name to name
 
-        """        
-        #Requesting all scene names
-        if len(msg) == 2 or (len(msg) == 3 and msg[2] == "query"):
-            bundle = OSC.OSCBundle()
-            sceneNumber = 0
-            for scene in LiveUtils.getScenes():
-                bundle.append("/live/name/scene", (sceneNumber, str(scene.name)))
-                sceneNumber = sceneNumber + 1
-            self.oscEndpoint.sendMessage(bundle)
-            return
-        #Requesting a single scene name
-        if len(msg) == 3:
-            sceneNumber = msg[2]
-            self.oscEndpoint.send("/live/name/scene", (sceneNumber, str(LiveUtils.getScene(sceneNumber).name)))
-            return
-        #renaming a scene
-        if len(msg) == 4:
-            sceneNumber = msg[2]
-            name = msg[3]
-            LiveUtils.getScene(sceneNumber).name = name
+        """
+        bundle = OSC.OSCBundle()
+        sceneNumber = 0
+        for scene in LiveUtils.getScenes():
+            bundle.append("/live/name/scene", (sceneNumber, str(scene.name)))
+            sceneNumber = sceneNumber + 1
+        self.oscEndpoint.sendMessage(bundle)
+
+    def nameSceneCB(self, msg, source):
+        sceneNumber = msg[2]
+        self.oscEndpoint.send("/live/name/scene", (sceneNumber, str(LiveUtils.getScene(sceneNumber).name)))
+
+    def renameSceneCB(self, msg, source):
+        LiveUtils.getScene(msg[2]).name = msg[3]
 
     def nameSceneBlockCB(self, msg, source):
         """Called when a /live/name/sceneblock message is received.
 
         /live/name/clipblock    (int offset, int blocksize) Returns a list of blocksize scene names starting at offset
         """
-        if len(msg) == 4:
-            block = []
-            sceneOffset = msg[2]
-            blocksize = msg[3]
-            for scene in range(0, blocksize):
-                block.extend([str(LiveUtils.getScene(sceneOffset+scene).name)])                            
-            self.oscEndpoint.send("/live/name/sceneblock", block)
-            
-            
-    def nameTrackCB(self, msg, source):
+        block = []
+        sceneOffset = msg[2]
+        blocksize = msg[3]
+        for scene in range(0, blocksize):
+            block.extend([str(LiveUtils.getScene(sceneOffset+scene).name)])
+        self.oscEndpoint.send("/live/name/sceneblock", block)
+
+    def nameTracksCB(self, msg, source):
         """Called when a /live/name/track message is received.
 
         Messages:
@@ -413,38 +761,36 @@ class LiveOSCCallbacks:
         /live/name/track    (int track, string name)Sets track number track's name to name
 
         """
-        #Requesting all track names
-        if len(msg) == 2 or (len(msg) == 3 and msg[2] == "query"):
-            trackNumber = 0
-            bundle = OSC.OSCBundle()
-            for track in LiveUtils.getTracks():
-                bundle.append("/live/name/track", (trackNumber, str(track.name)))
-                trackNumber = trackNumber + 1
-            self.oscEndpoint.sendMessage(bundle)
-            return
-        #Requesting a single track name
-        if len(msg) == 3:
-            trackNumber = msg[2]
-            self.oscEndpoint.send("/live/name/track", (trackNumber, str(LiveUtils.getTrack(trackNumber).name)))
-            return
-        #renaming a track
-        if len(msg) == 4:
-            trackNumber = msg[2]
-            name = msg[3]
-            LiveUtils.getTrack(trackNumber).name = name
+        trackNumber = 0
+        bundle = OSC.OSCBundle()
+        mirror = self.namedMirror()
+        if mirror != None:
+            tracks = mirror.tracks
+        else:
+            tracks = LiveUtils.getTracks()
+        for track in tracks:
+            bundle.append("/live/name/track", (trackNumber, str(track.name)))
+            trackNumber = trackNumber + 1
+        self.oscEndpoint.sendMessage(bundle)
+
+    def nameTrackCB(self, msg, source):
+        trackNumber = msg[2]
+        self.oscEndpoint.send("/live/name/track", (trackNumber, str(self.trackValue(TRACK, trackNumber, "name"))))
+
+    def renameTrackCB(self, msg, source):
+        LiveUtils.getTrack(msg[2]).name = msg[3]
 
     def nameTrackBlockCB(self, msg, source):
         """Called when a /live/name/trackblock message is received.
 
         /live/name/trackblock    (int offset, int blocksize) Returns a list of blocksize track names starting at offset
         """
-        if len(msg) == 4:
-            block = []
-            trackOffset = msg[2]
-            blocksize = msg[3]
-            for track in range(0, blocksize):
-                block.extend([str(LiveUtils.getTrack(trackOffset+track).name)])                            
-            self.oscEndpoint.send("/live/name/trackblock", block)
+        block = []
+        trackOffset = msg[2]
+        blocksize = msg[3]
+        for track in range(0, blocksize):
+            block.extend([str(self.trackValue(TRACK, trackOffset+track, "name"))])
+        self.oscEndpoint.send("/live/name/trackblock", block)
 
     def nameClipBlockCB(self, msg, source):
         """Called when a /live/name/clipblock message is received.
@@ -453,27 +799,23 @@ class LiveOSCCallbacks:
 
         """
         #Requesting a block of clip names X1 Y1 X2 Y2 where X1,Y1 is the first clip (track, clip) of the block, X2 the number of tracks to cover and Y2 the number of scenes
-        
-        if len(msg) == 6:
-            block = []
-            trackOffset = msg[2]
-            clipOffset = msg[3]
-            blocksizeX = msg[4]
-            blocksizeY = msg[5]
-            for clip in range(0, blocksizeY):
-                for track in range(0, blocksizeX):
-                        trackNumber = trackOffset+track
-                        clipNumber = clipOffset+clip
-                        if LiveUtils.getClip(trackNumber, clipNumber) != None:
-                            block.extend([str(LiveUtils.getClip(trackNumber, clipNumber).name)])
-                        else:
-                            block.extend([""])
-                            
-            self.oscEndpoint.send("/live/name/clipblock", block)
 
+        block = []
+        mirror = self.namedMirror()
+        if mirror != None:
+            rows = mirror.clipBlock(msg[2], msg[3], msg[4], msg[5])
+        else:
+            rows = LiveUtils.getClipBlock(msg[2], msg[3], msg[4], msg[5])
+        for row in rows:
+            for clip in row:
+                if clip != None:
+                    block.append(str(clip.name))
+                else:
+                    block.append("")
 
+        self.oscEndpoint.send("/live/name/clipblock", block)
 
-    def nameClipCB(self, msg, source):
+    def nameClipsCB(self, msg, source):
         """Called when a /live/name/clip message is received.
 
         Messages:
@@ -482,38 +824,29 @@ class LiveOSCCallbacks:
         /live/name/clip    (int track, int clip, string name)Sets clip number clip in track number track's name to name
 
         """
-        #Requesting all clip names
-        if len(msg) == 2 or (len(msg) == 3 and msg[2] == "query"):
-            trackNumber = 0
+        trackNumber = 0
+        clipNumber = 0
+        for clips in self.trackClips(1):
+            bundle = OSC.OSCBundle()
+            for clip in clips:
+                if clip != None:
+                    bundle.append("/live/name/clip", (trackNumber, clipNumber, str(clip.name), clip.color))
+                clipNumber = clipNumber + 1
+            self.oscEndpoint.sendMessage(bundle)
             clipNumber = 0
-            for track in LiveUtils.getTracks():
-                bundle = OSC.OSCBundle()
-                for clipSlot in track.clip_slots:
-                    if clipSlot.clip != None:
-                        bundle.append("/live/name/clip", (trackNumber, clipNumber, str(clipSlot.clip.name), clipSlot.clip.color))
-                    clipNumber = clipNumber + 1
-                self.oscEndpoint.sendMessage(bundle)
-                clipNumber = 0
-                trackNumber = trackNumber + 1
-            return
-        #Requesting a single clip name
-        if len(msg) == 4:
-            trackNumber = msg[2]
-            clipNumber = msg[3]
-            self.oscEndpoint.send("/live/name/clip", (trackNumber, clipNumber, str(LiveUtils.getClip(trackNumber, clipNumber).name), LiveUtils.getClip(trackNumber, clipNumber).color))
-            return
-        #renaming a clip
-        if len(msg) >= 5:
-            trackNumber = msg[2]
-            clipNumber = msg[3]
-            name = msg[4]
-            LiveUtils.getClip(trackNumber, clipNumber).name = name
-
-        if len(msg) >= 6:
-            trackNumber = msg[2]
-            clipNumber = msg[3]
-            color = msg[5]
-            LiveUtils.getClip(trackNumber, clipNumber).color = color
+            trackNumber = trackNumber + 1
+
+    def nameClipCB(self, msg, source):
+        trackNumber = msg[2]
+        clipNumber = msg[3]
+        clip = self.getClip(trackNumber, clipNumber, 1)
+        self.oscEndpoint.send("/live/name/clip", (trackNumber, clipNumber, str(clip.name), clip.color))
+
+    def renameClipCB(self, msg, source):
+        clip = LiveUtils.getClip(msg[2], msg[3])
+        clip.name = msg[4]
+        if len(msg) == 6:
+            clip.color = msg[5]
 
     def addNoteCB(self, msg, source):
         """Called when a /live/clip/add_note message is received
@@ -524,10 +857,10 @@ class LiveOSCCallbacks:
         trackNumber = msg[2]
         clipNumber = msg[3]
         pitch = msg[4]
-        time = msg[5]
-        duration = msg[6]
-        velocity = msg[7]
-        muted = msg[8]
+        time = float(msg[5])
+        duration = float(msg[6])
+        velocity = int(msg[7])
+        muted = int(msg[8])
         LiveUtils.getClip(trackNumber, clipNumber).deselect_all_notes()
 
         notes = ((pitch, time, duration, velocity, muted),)
@@ -555,199 +888,123 @@ class LiveOSCCallbacks:
                 muted = 1
             bundle.append('/live/clip/note', (trackNumber, clipNumber, pitch, time, duration, velocity, muted))
         self.oscEndpoint.sendMessage(bundle)
-    
-    def armTrackCB(self, msg, source):
+
+    def armTrackCB(self, msg, source, kind):
         """Called when a /live/arm message is received.
 
         Messages:
         /live/arm     (int track)   (int armed/disarmed)     Arms track number track
         """
         track = msg[2]
-        
-        if len(msg) == 4:
-            if msg[3] == 1:
-                LiveUtils.armTrack(track)
-            else:
-                LiveUtils.disarmTrack(track)
-        # Return arm status        
-        elif len(msg) == 3:
-            status = LiveUtils.getTrack(track).arm
-            self.oscEndpoint.send("/live/arm", (track, int(status)))     
-            
-    def muteTrackCB(self, msg, source):
-        """Called when a /live/mute message is received.
+        status = self.trackValue(kind, track, "arm")
+        self.oscEndpoint.send("/live/arm", (track, int(status)))
+
+    def setArmTrackCB(self, msg, source, kind):
+        if msg[3] == 1:
+            LiveUtils.armTrack(msg[2])
+        else:
+            LiveUtils.disarmTrack(msg[2])
+
+    def muteTrackCB(self, msg, source, kind):
+        """Called when a /live/mute or /live/return/mute message is received.
 
         Messages:
         /live/mute     (int track)   Mutes track number track
         """
-        ty = msg[0] == '/live/return/mute' and 1 or 0
         track = msg[2]
-            
-        if len(msg) == 4:
-            if msg[3] == 1:
-                LiveUtils.muteTrack(track, ty)
-            else:
-                LiveUtils.unmuteTrack(track, ty)
-                
-        elif len(msg) == 3:
-            if ty == 1:
-                status = LiveUtils.getSong().return_tracks[track].mute
-                self.oscEndpoint.send("/live/return/mute", (track, int(status)))
-                
-            else:
-                status = LiveUtils.getTrack(track).mute
-                self.oscEndpoint.send("/live/mute", (track, int(status)))
-            
-    def soloTrackCB(self, msg, source):
-        """Called when a /live/solo message is received.
+        status = self.trackValue(kind, track, "mute")
+        self.oscEndpoint.send(msg[0], (track, int(status)))
+
+    def setMuteTrackCB(self, msg, source, kind):
+        if msg[3] == 1:
+            LiveUtils.muteTrack(msg[2], kind)
+        else:
+            LiveUtils.unmuteTrack(msg[2], kind)
+
+    def soloTrackCB(self, msg, source, kind):
+        """Called when a /live/solo or /live/return/solo message is received.
 
         Messages:
         /live/solo     (int track)   Solos track number track
         """
-        ty = msg[0] == '/live/return/solo' and 1 or 0
         track = msg[2]
-        
-        if len(msg) == 4:
-            if msg[3] == 1:
-                LiveUtils.soloTrack(track, ty)
-            else:
-                LiveUtils.unsoloTrack(track, ty)
-            
-        elif len(msg) == 3:
-            if ty == 1:
-                status = LiveUtils.getSong().return_tracks[track].solo
-                self.oscEndpoint.send("/live/return/solo", (track, int(status)))
-                
-            else:
-                status = LiveUtils.getTrack(track).solo
-                self.oscEndpoint.send("/live/solo", (track, int(status)))
-            
-    def volumeCB(self, msg, source):
-        """Called when a /live/volume message is received.
+        status = self.trackValue(kind, track, "solo")
+        self.oscEndpoint.send(msg[0], (track, int(status)))
+
+    def setSoloTrackCB(self, msg, source, kind):
+        if msg[3] == 1:
+            LiveUtils.soloTrack(msg[2], kind)
+        else:
+            LiveUtils.unsoloTrack(msg[2], kind)
+
+    def volumeCB(self, msg, source, kind):
+        """Called when a /live/volume, /live/return/volume or /live/master/volume message is received.
 
         Messages:
         /live/volume     (int track)                            Returns the current volume of track number track as: /live/volume (int track, float volume(0.0 to 1.0))
         /live/volume     (int track, float volume(0.0 to 1.0))  Sets track number track's volume to volume
         """
-        if msg[0] == '/live/return/volume':
-            ty = 1
-        elif msg[0] == '/live/master/volume':
-            ty = 2
+        if kind == MASTER:
+            self.oscEndpoint.send(msg[0], self.mixerValue(kind, 0, "volume"))
         else:
-            ty = 0
-        
-        if len(msg) == 2 and ty == 2:
-            self.oscEndpoint.send("/live/master/volume", LiveUtils.getSong().master_track.mixer_device.volume.value)
-        
-        elif len(msg) == 3 and ty == 2:
-            volume = float(msg[2])
-            LiveUtils.getSong().master_track.mixer_device.volume.value = volume
-        
-        elif len(msg) == 4:
-            track = int(msg[2])
-            volume = float(msg[3])
-            
-            if ty == 0:
-                LiveUtils.trackVolume(track, volume)
-            elif ty == 1:
-                LiveUtils.getSong().return_tracks[track].mixer_device.volume.value = volume
-
-        elif len(msg) == 3:
-            track = int(msg[2])
-
-            if ty == 1:
-                self.oscEndpoint.send("/live/return/volume", (track, LiveUtils.getSong().return_tracks[track].mixer_device.volume.value))
-            
-            else:
-                self.oscEndpoint.send("/live/volume", (track, LiveUtils.trackVolume(track)))
-            
-    def panCB(self, msg, source):
-        """Called when a /live/pan message is received.
+            track = msg[2]
+            self.oscEndpoint.send(msg[0], (track, self.mixerValue(kind, track, "volume")))
+
+    def setVolumeCB(self, msg, source, kind):
+        if kind == MASTER:
+            LiveUtils.getAnyTrack(kind).mixer_device.volume.value = float(msg[2])
+        else:
+            LiveUtils.getAnyTrack(kind, msg[2]).mixer_device.volume.value = float(msg[3])
+
+    def panCB(self, msg, source, kind):
+        """Called when a /live/pan, /live/return/pan or /live/master/pan message is received.
 
         Messages:
         /live/pan     (int track)                            Returns the pan of track number track as: /live/pan (int track, float pan(-1.0 to 1.0))
         /live/pan     (int track, float pan(-1.0 to 1.0))    Sets track number track's pan to pan
 
         """
-        if msg[0] == '/live/return/pan':
-            ty = 1
-        elif msg[0] == '/live/master/pan':
-            ty = 2
+        if kind == MASTER:
+            self.oscEndpoint.send(msg[0], self.mixerValue(kind, 0, "panning"))
         else:
-            ty = 0
-        
-        if len(msg) == 2 and ty == 2:
-            self.oscEndpoint.send("/live/master/pan", LiveUtils.getSong().master_track.mixer_device.panning.value)
-        
-        elif len(msg) == 3 and ty == 2:
-            pan = msg[2]
-            LiveUtils.getSong().master_track.mixer_device.panning.value = pan
-            
-        elif len(msg) == 4:
-            track = msg[2]
-            pan = msg[3]
-            
-            if ty == 0:
-                LiveUtils.trackPan(track, pan)
-            elif ty == 1:
-                LiveUtils.getSong().return_tracks[track].mixer_device.panning.value = pan
-            
-        elif len(msg) == 3:
             track = msg[2]
-            
-            if ty == 1:
-                self.oscEndpoint.send("/live/pan", (track, LiveUtils.getSong().return_tracks[track].mixer_device.panning.value))
-            
-            else:
-                self.oscEndpoint.send("/live/pan", (track, LiveUtils.trackPan(track)))
+            self.oscEndpoint.send(msg[0], (track, self.mixerValue(kind, track, "panning")))
+
+    def setPanCB(self, msg, source, kind):
+        if kind == MASTER:
+            LiveUtils.getAnyTrack(kind).mixer_device.panning.value = float(msg[2])
+        else:
+            LiveUtils.getAnyTrack(kind, msg[2]).mixer_device.panning.value = float(msg[3])
 
-            
-    def sendCB(self, msg, source):
-        """Called when a /live/send message is received.
+    def sendsCB(self, msg, source, kind):
+        """Called when a /live/send or /live/return/send message is received.
 
         Messages:
+        /live/send     (int track)                                        Returns a list of all sends and values on track number track as: /live/send (int track, int send, float level, int send, ...)
         /live/send     (int track, int send)                              Returns the send level of send (send) on track number track as: /live/send (int track, int send, float level(0.0 to 1.0))
         /live/send     (int track, int send, float level(0.0 to 1.0))     Sets the send (send) of track number (track)'s level to (level)
 
         """
-        ty = msg[0] == '/live/return/send' and 1 or 0
         track = msg[2]
-        
-        if len(msg) == 5:
-            send = msg[3]
-            level = msg[4]
-            if ty == 1:
-                LiveUtils.getSong().return_tracks[track].mixer_device.sends[send].value = level
-            
-            else:
-                LiveUtils.trackSend(track, send, level)
-        
-        elif len(msg) == 4:
-            send = msg[3]
-            if ty == 1:
-                self.oscEndpoint.send("/live/return/send", (track, send, float(LiveUtils.getSong().return_tracks[track].mixer_device.sends[send].value)))
+        sends = self.sendValues(kind, track)
+
+        so = [track]
+        for i in range(len(sends)):
+            so.append(i)
+            so.append(sends[i])
+
+        self.oscEndpoint.send(msg[0], tuple(so))
+
+    def sendCB(self, msg, source, kind):
+        track = msg[2]
+        send = msg[3]
+        sends = self.sendValues(kind, track)
+        LiveUtils.checkRange('send', send, 1, len(sends))
+        self.oscEndpoint.send(msg[0], (track, send, sends[send]))
+
+    def setSendCB(self, msg, source, kind):
+        LiveUtils.getAnyTrack(kind, msg[2]).mixer_device.sends[msg[3]].value = float(msg[4])
 
-            else:
-                self.oscEndpoint.send("/live/send", (track, send, float(LiveUtils.trackSend(track, send))))
-            
-        elif len(msg) == 3:
-            if ty == 1:
-                sends = LiveUtils.getSong().return_tracks[track].mixer_device.sends
-            else:
-                sends = LiveUtils.getSong().visible_tracks[track].mixer_device.sends
-                
-            so = [track]
-            for i in range(len(sends)):
-                so.append(i)
-                so.append(float(sends[i].value))
-                
-            if ty == 1:
-                self.oscEndpoint.send("/live/return/send", tuple(so))
-            else:
-                self.oscEndpoint.send("/live/send", tuple(so))
-                
-        
-            
     def pitchCB(self, msg, source):
         """Called when a /live/pitch message is received.
 
@@ -756,16 +1013,10 @@ class LiveOSCCallbacks:
         /live/pitch     (int track, int clip, int coarse(-48 to 48), int fine (-50 to 50))  Sets clip number clip in track number track's pitch to coarse / fine
 
         """
-        if len(msg) == 6:
-            track = msg[2]
-            clip = msg[3]
-            coarse = msg[4]
-            fine = msg[5]
-            LiveUtils.clipPitch(track, clip, coarse, fine)
-        if len(msg) ==4:
-            track = msg[2]
-            clip = msg[3]
-            self.oscEndpoint.send("/live/pitch", LiveUtils.clipPitch(track, clip))
+        self.oscEndpoint.send("/live/pitch", LiveUtils.clipPitch(msg[2], msg[3]))
+
+    def setPitchCB(self, msg, source):
+        LiveUtils.clipPitch(msg[2], msg[3], msg[4], msg[5])
 
     def trackJump(self, msg, source):
         """Called when a /live/track/jump message is received.
@@ -773,11 +1024,7 @@ class LiveOSCCallbacks:
         Messages:
         /live/track/jump     (int track, float beats)   Jumps in track's currently running session clip by beats
         """
-        if len(msg) == 4:
-            track = msg[2]
-            beats = msg[3]
-            track = LiveUtils.getTrack(track)
-            track.jump_in_running_session_clip(beats)
+        LiveUtils.getTrack(msg[2]).jump_in_running_session_clip(float(msg[3]))
 
     def trackInfoCB(self, msg, source):
         """Called when a /live/track/info message is received.
@@ -786,137 +1033,105 @@ class LiveOSCCallbacks:
         /live/track/info     (int track)   Returns clip slot status' for all clips in a track in the form /live/track/info (tracknumber, armed  (clipnumber, state, length))
                                            [state: 1 = Has Clip, 2 = Playing, 3 = Triggered]
         """
-        
-        clipslots = LiveUtils.getClipSlots()
-        
-        new = []
+
+        clips = self.trackClips()
+
         if len(msg) == 3:
-            new.append(clipslots[msg[2]])
-            tracknum = msg[2] - 1
+            LiveUtils.checkRange('track', msg[2], 1, len(clips))
+            tracknums = [msg[2]]
         else:
-            new = clipslots
-            tracknum = -1
-        
-        for track in new:
-            tracknum = tracknum + 1
-            clipnum = -1
-            tmptrack = LiveUtils.getTrack(tracknum)
-            armed = tmptrack.arm and 1 or 0
+            tracknums = range(len(clips))
+
+        mirror = self.mirrored()
+        for tracknum in tracknums:
+            if mirror != None:
+                armed = mirror.track(TRACK, tracknum).arm
+            else:
+                armed = LiveUtils.getTrack(tracknum).arm and 1 or 0
             li = [tracknum, armed]
-            for clipSlot in track:
+            clipnum = -1
+            for clip in clips[tracknum]:
                 clipnum = clipnum + 1
-                li.append(clipnum);
-                if clipSlot.clip != None:
-                    clip = clipSlot.clip
-                    if clip.is_playing == 1:
-                        li.append(2)
-                        li.append(clip.length)
-                        
-                    elif clip.is_triggered == 1:
-                        li.append(3)
-                        li.append(clip.length)
-                        
-                    else:
-                        li.append(1)
-                        li.append(clip.length)
-                else:
+                li.append(clipnum)
+                if clip == None:
                     li.append(0)
                     li.append(0.0)
-                    
+                else:
+                    if mirror != None:
+                        li.append(clip.state)
+                    else:
+                        li.append(LiveMirror.clipState(clip))
+                    li.append(clip.length)
+
             tu = tuple(li)
-            
+
             self.oscEndpoint.send("/live/track/info", tu)
 
 
     def undoCB(self, msg, source):
         """Called when a /live/undo message is received.
-        
+
         Messages:
         /live/undo      Requests the song to undo the last action
         """
         LiveUtils.getSong().undo()
-        
+
     def redoCB(self, msg, source):
         """Called when a /live/redo message is received.
-        
+
         Messages:
         /live/redo      Requests the song to redo the last action
         """
         LiveUtils.getSong().redo()
-        
+
     def playClipSlotCB(self, msg, source):
         """Called when a /live/play/clipslot message is received.
-        
+
         Messages:
         /live/play/clipslot     (int track, int clip)   Launches clip number clip in track number track
         """
-        if len(msg) == 4:
-            track_num = msg[2]
-            clip_num = msg[3]
-            track = LiveUtils.getTrack(track_num)
-            clipslot = track.clip_slots[clip_num]
-            clipslot.fire()
+        LiveUtils.getTrack(msg[2]).clip_slots[msg[3]].fire()
 
     def viewSceneCB(self, msg, source):
         """Called when a /live/scene/view message is received.
-        
+
         Messages:
         /live/scene/view     (int track)      Selects a track to view
         """
-        
-        if len(msg) == 3:
-            scene = msg[2]
-            LiveUtils.getSong().view.selected_scene = LiveUtils.getSong().scenes[scene]
-            
-    def viewTrackCB(self, msg, source):
-        """Called when a /live/track/view message is received.
-        
-        Messages:
-        /live/track/view     (int track)      Selects a track to view
-        """
-        ty = msg[0] == '/live/return/view' and 1 or 0
-        track_num = msg[2]
-        
-        if len(msg) == 3:
-            if ty == 1:
-                track = LiveUtils.getSong().return_tracks[track_num]
-            else:
-                track = LiveUtils.getSong().visible_tracks[track_num]
-                
-            LiveUtils.getSong().view.selected_track = track
-            Live.Application.get_application().view.show_view("Detail/DeviceChain")
-                
-            #track.view.select_instrument()
-            
-    def mviewTrackCB(self, msg, source):
-        """Called when a /live/master/view message is received.
-        
+        LiveUtils.getSong().view.selected_scene = LiveUtils.getScene(msg[2])
+
+    def viewTrackCB(self, msg, source, kind):
+        """Called when a /live/track/view, /live/return/view or /live/master/view message is received.
+
         Messages:
         /live/track/view     (int track)      Selects a track to view
         """
-        track = LiveUtils.getSong().master_track
+        if kind == MASTER:
+            track = LiveUtils.getAnyTrack(kind)
+        else:
+            track = LiveUtils.getAnyTrack(kind, msg[2])
 
         LiveUtils.getSong().view.selected_track = track
-        Live.Application.get_application().view.show_view("Detail/DeviceChain")        
-        
+        Live.Application.get_application().view.show_view("Detail/DeviceChain")
+
         #track.view.select_instrument()
-        
+
     def viewClipCB(self, msg, source):
         """Called when a /live/clip/view message is received.
-        
+
         Messages:
         /live/clip/view     (int track, int clip)      Selects a track to view
         """
-        track = LiveUtils.getSong().visible_tracks[msg[2]]
-        
+        track = LiveUtils.getTrack(msg[2])
+
         if len(msg) == 4:
             clip  = msg[3]
         else:
             clip  = 0
-        
+
         LiveUtils.getSong().view.selected_track = track
         LiveUtils.getSong().view.detail_clip = track.clip_slots[clip].clip
-        Live.Application.get_application().view.show_view("Detail/Clip")  
+        Live.Application.get_application().view.show_view("Detail/Clip")
 
     def detailViewCB(self, msg, source):
         """Called when a /live/detail/view message is received. Used to switch between clip/track detail
@@ -924,300 +1139,247 @@ class LiveOSCCallbacks:
         Messages:
         /live/detail/view (int) Selects view where 0=clip detail, 1=track detail
         """
-        if len(msg) == 3:
-            if msg[2] == 0:
-                Live.Application.get_application().view.show_view("Detail/Clip")
-            elif msg[2] == 1:
-                Live.Application.get_application().view.show_view("Detail/DeviceChain")
+        if msg[2] == 0:
+            Live.Application.get_application().view.show_view("Detail/Clip")
+        elif msg[2] == 1:
+            Live.Application.get_application().view.show_view("Detail/DeviceChain")
 
-    def viewDeviceCB(self, msg, source):
+    def viewDeviceCB(self, msg, source, kind):
         """Called when a /live/track/device/view message is received.
-        
+
         Messages:
         /live/track/device/view     (int track)      Selects a track to view
         """
-        ty = msg[0] == '/live/return/device/view' and 1 or 0
-        track_num = msg[2]
-        
-        if len(msg) == 4:
-            if ty == 1:
-                track = LiveUtils.getSong().return_tracks[track_num]
-            else:
-                track = LiveUtils.getSong().visible_tracks[track_num]
+        if kind == MASTER:
+            track = LiveUtils.getAnyTrack(kind)
+        else:
+            track = LiveUtils.getAnyTrack(kind, msg[2])
+
+        LiveUtils.getSong().view.selected_track = track
+        LiveUtils.getSong().view.select_device(track.devices[msg[-1]])
+        Live.Application.get_application().view.show_view("Detail/DeviceChain")
 
-            LiveUtils.getSong().view.selected_track = track
-            LiveUtils.getSong().view.select_device(track.devices[msg[3]])
-            Live.Application.get_application().view.show_view("Detail/DeviceChain")
-            
-    def mviewDeviceCB(self, msg, source):
-        track = LiveUtils.getSong().master_track
-        
-        if len(msg) == 3:
-            LiveUtils.getSong().view.selected_track = track
-            LiveUtils.getSong().view.select_device(track.devices[msg[2]])
-            Live.Application.get_application().view.show_view("Detail/DeviceChain")
-        
     def overdubCB(self, msg, source):
         """Called when a /live/overdub message is received.
-        
+
         Messages:
         /live/overdub     (int on/off)      Enables/disables overdub
-        """        
-        if len(msg) == 3:
-            overdub = msg[2]
-            LiveUtils.getSong().overdub = overdub
+        """
+        LiveUtils.getSong().overdub = int(msg[2])
 
     def stateCB(self, msg, source):
         """Called when a /live/state is received.
-        
+
         Messages:
         /live/state                    Returns the current tempo and overdub status
         """
-        if len(msg) == 2 or (len(msg) == 3 and msg[2] == "query"):
-            tempo = LiveUtils.getTempo()
-            overdub = LiveUtils.getSong().overdub
-            self.oscEndpoint.send("/live/state", (tempo, int(overdub)))
-        
-    def clipInfoCB(self,msg):
+        tempo = LiveUtils.getTempo()
+        overdub = LiveUtils.getSong().overdub
+        self.oscEndpoint.send("/live/state", (tempo, int(overdub)))
+
+    def clipInfoCB(self, msg, source):
         """Called when a /live/clip/info message is received.
-        
+
         Messages:
         /live/clip/info     (int track, int clip)      Gets the status of a single clip in the form  /live/clip/info (tracknumber, clipnumber, state)
                                                        [state: 1 = Has Clip, 2 = Playing, 3 = Triggered]
         """
-        
-        if len(msg) == 4:
-            trackNumber = msg[2]
-            clipNumber = msg[3]    
-            
-            clip = LiveUtils.getClip(trackNumber, clipNumber)
-            
-            playing = 0
-            
-            if clip != None:
-                playing = 1
-                
-                if clip.is_playing == 1:
-                    playing = 2
-                elif clip.is_triggered == 1:
-                    playing = 3
-
-            self.oscEndpoint.send("/live/clip/info", (trackNumber, clipNumber, playing))
-        
-        return
-        
-    def deviceCB(self, msg, source):
-        ty = msg[0] == '/live/return/device' and 1 or 0
-        track = msg[2]
-    
-        if len(msg) == 4:
-            device = msg[3]
-            po = [track, device]
-            
-            if ty == 1:
-                params = LiveUtils.getSong().return_tracks[track].devices[device].parameters
-            else:
-                params = LiveUtils.getSong().visible_tracks[track].devices[device].parameters
-    
-            for i in range(len(params)):
-                po.append(i)
-                po.append(float(params[i].value))
-                po.append(str(params[i].name))
-            
-            self.oscEndpoint.send(ty == 1 and "/live/return/device/allparam" or "/live/device/allparam", tuple(po))
-    
-        elif len(msg) == 5:
-            device = msg[3]
-            param  = msg[4]
-            
-            if ty == 1:
-                p = LiveUtils.getSong().return_tracks[track].devices[device].parameters[param]
-            else: 
-                p = LiveUtils.getSong().visible_tracks[track].devices[device].parameters[param]
-        
-            self.oscEndpoint.send(ty == 1 and "/live/return/device/param" or "/live/device/param", (track, device, param, p.value, str(p.name)))
-    
-    
-        elif len(msg) == 6:
-            device = msg[3]
-            param  = msg[4]
-            value  = msg[5]
-        
-            if ty == 1:
-                LiveUtils.getSong().return_tracks[track].devices[device].parameters[param].value = value
-            else:
-                LiveUtils.getSong().visible_tracks[track].devices[device].parameters[param].value = value
+        trackNumber = msg[2]
+        clipNumber = msg[3]
 
-    def devicerangeCB(self, msg, source):
-        ty = msg[0] == '/live/return/device/range' and 1 or 0
-        track = msg[2]
-    
-        if len(msg) == 4:
-            device = msg[3]
-            po = [track, device]
-            
-            if ty == 1:
-                params = LiveUtils.getSong().return_tracks[track].devices[device].parameters
-            else:
-                params = LiveUtils.getSong().visible_tracks[track].devices[device].parameters
-    
-            for i in range(len(params)):
-                po.append(i)
-                po.append(params[i].min)
-                po.append(params[i].max)
-            
-            self.oscEndpoint.send(ty == 1 and "/live/return/device/range" or "/live/device/range", tuple(po))
-    
-        elif len(msg) == 5:
-            device = msg[3]
-            param  = msg[4]
-            
-            if ty == 1:
-                p = LiveUtils.getSong().return_tracks[track].devices[device].parameters[param]
-            else: 
-                p = LiveUtils.getSong().visible_tracks[track].devices[device].parameters[param]
-        
-            self.oscEndpoint.send(ty == 1 and "/live/return/device/range" or "/live/device/range", (track, device, param, p.min, p.max))
-                
-    def devicelistCB(self, msg, source):
-        ty = msg[0] == '/live/return/devicelist' and 1 or 0
+        clip = self.getClip(trackNumber, clipNumber)
 
-        track = msg[2]
-    
-        if len(msg) == 3:
-            do = [track]
-            
-            if ty == 1:
-                devices = LiveUtils.getSong().return_tracks[track].devices
-            else:
-                devices = LiveUtils.getSong().visible_tracks[track].devices
-        
-            for i in range(len(devices)):
-                do.append(i)
-                do.append(str(devices[i].name))
-            
-            self.oscEndpoint.send(ty == 1 and "/live/return/devicelist" or "/live/devicelist", tuple(do))
-
-    def mdeviceCB(self, msg, source):
-        if len(msg) == 3:
-            device = msg[2]
-            po = [device]
-            
-            params = LiveUtils.getSong().master_track.devices[device].parameters
-    
-            for i in range(len(params)):
-                po.append(i)
-                po.append(float(params[i].value))
-                po.append(str(params[i].name))
-            
-            self.oscEndpoint.send("/live/master/device", tuple(po))
-    
-        elif len(msg) == 4:
-            device = msg[2]
-            param  = msg[3]
-            
-            p = LiveUtils.getSong().master_track.devices[device].parameters[param]
-        
-            self.oscEndpoint.send("/live/master/device", (device, param, p.value, str(p.name)))
-    
-        elif len(msg) == 5:
-            device = msg[2]
-            param  = msg[3]
-            value  = msg[4]
-        
-            LiveUtils.getSong().master_track.devices[device].parameters[param].value = value
-
-    def mdevicerangeCB(self, msg, source):
-        if len(msg) == 3:
-            device = msg[2]
-            po = [device]
-            
-            params = LiveUtils.getSong().master_track.devices[device].parameters
-    
-            for i in range(len(params)):
-                po.append(i)
-                po.append(params[i].max)
-                po.append(params[i].min)
-            
-            self.oscEndpoint.send("/live/master/device/range", tuple(po))
-    
-        elif len(msg) == 4:
-            device = msg[2]
-            param  = msg[3]
-            
-            p = LiveUtils.getSong().master_track.devices[device].parameters[param]
-        
-            self.oscEndpoint.send("/live/master/device/range", (device, param, p.min, p.max))
-            
-    def mdevicelistCB(self, msg, source):
-        if len(msg) == 2 or (len(msg) == 3 and msg[2] == "query"):
+        if self.mirrored() != None:
+            playing = clip and clip.state or 0
+        else:
+            playing = LiveMirror.clipState(clip)
+
+        self.oscEndpoint.send("/live/clip/info", (trackNumber, clipNumber, playing))
+
+    # The device handlers take the track number as first argument,
+    # except for the master track, which has no track argument.  The
+    # replies for the master track are sent without it, too.
+
+    def deviceArguments(self, msg, kind):
+        """Returns the track number, its argument list for replies and
+        the index of the first device argument in msg."""
+        if kind == MASTER:
+            return (0, [], 2)
+        else:
+            return (msg[2], [msg[2]], 3)
+
+    def deviceCB(self, msg, source, kind):
+        track, po, i = self.deviceArguments(msg, kind)
+        device = msg[i]
+        po.append(device)
+        record = self.getDevice(kind, track, device)
+
+        for i in range(len(record.parameters)):
+            po.append(i)
+            po.append(float(record.parameters[i].value))
+            po.append(str(record.parameters[i].name))
+
+        if kind == MASTER:
+            address = "/live/master/device"
+        elif kind == RETURN:
+            address = "/live/return/device/allparam"
+        else:
+            address = "/live/device/allparam"
+        self.oscEndpoint.send(address, tuple(po))
+
+    def deviceParamCB(self, msg, source, kind):
+        track, po, i = self.deviceArguments(msg, kind)
+        device = msg[i]
+        param  = msg[i + 1]
+        record = self.getDevice(kind, track, device)
+        LiveUtils.checkRange('parameter', param, 1, len(record.parameters))
+        p = record.parameters[param]
+
+        if kind == MASTER:
+            address = "/live/master/device"
+        elif kind == RETURN:
+            address = "/live/return/device/param"
+        else:
+            address = "/live/device/param"
+        self.oscEndpoint.send(address, tuple(po + [device, param, p.value, str(p.name)]))
+
+    def setDeviceParamCB(self, msg, source, kind):
+        track, po, i = self.deviceArguments(msg, kind)
+        LiveUtils.getAnyTrack(kind, track).devices[msg[i]].parameters[msg[i + 1]].value = msg[i + 2]
+
+    def devicerangeCB(self, msg, source, kind):
+        track, po, i = self.deviceArguments(msg, kind)
+        device = msg[i]
+        po.append(device)
+        params = LiveUtils.getAnyTrack(kind, track).devices[device].parameters
+
+        for i in range(len(params)):
+            po.append(i)
+            po.append(params[i].min)
+            po.append(params[i].max)
+
+        self.oscEndpoint.send(msg[0], tuple(po))
+
+    def deviceParamRangeCB(self, msg, source, kind):
+        track, po, i = self.deviceArguments(msg, kind)
+        device = msg[i]
+        param  = msg[i + 1]
+        p = LiveUtils.getAnyTrack(kind, track).devices[device].parameters[param]
+
+        self.oscEndpoint.send(msg[0], tuple(po + [device, param, p.min, p.max]))
+
+    def deviceBank(self, address, kind, track, po, device, bank, size):
+        """Returns the /live/device/bank reply for (bank) of (size) parameters of a device"""
+        record = self.getDevice(kind, track, device)
+        params = record.parameters
+        pids = LiveWatch.bankRange(len(params), bank, size)
+
+        po = po + [device, bank, (len(params) + size - 1) / size]
+        for pid in pids:
+            p = params[pid]
+            po.extend([pid, float(p.value), str(p.name), float(p.min), float(p.max)])
+        return OSC.OSCMessage(address, tuple(po))
+
+    def deviceBankCB(self, msg, source, kind):
+        """Called when a /live/device/bank, /live/return/device/bank or /live/master/device/bank message is received.
+
+        Messages:
+        /live/device/bank   (int track, int device, int bank, [int size])   Returns the parameters of bank number bank of size parameters, 8 by default,
+                                                                            as /live/device/bank (int track, int device, int bank, int banks,
+                                                                            int parameter, float value, string name, float min, float max, ...)
+        """
+        track, po, i = self.deviceArguments(msg, kind)
+        size = LiveWatch.BANK_SIZE
+        if len(msg) > i + 2:
+            size = msg[i + 2]
+        self.oscEndpoint.sendMessage(self.deviceBank(msg[0], kind, track, po, msg[i], msg[i + 1], size))
+
+    def deviceBankSelectCB(self, msg, source, kind):
+        """Called when a /live/device/bank/select, /live/return/device/bank/select or /live/master/device/bank/select message is received.
+
+        Messages:
+        /live/device/bank/select    (int track, int device, int bank, [int size], [int port])
+                                    Replies like /live/device/bank, then sends the changes of the parameters in the bank as
+                                    /live/watch (string path, float value) until another bank of the device is selected.  port selects the peer
+        """
+        track, po, i = self.deviceArguments(msg, kind)
+        device = msg[i]
+        bank = msg[i + 1]
+        size = LiveWatch.BANK_SIZE
+        if len(msg) > i + 2:
+            size = msg[i + 2]
+        path = "%s/device/%d/bank/%d/%d" % (LiveWatch.trackPath(kind, track), device, bank, size)
+        message = self.deviceBank(msg[0][:-len("/select")], kind, track, po, device, bank, size)
+
+        for peer in self.oscEndpoint.findPeers(msg, source, i + 3):
+            key = (peer.addr, LiveWatch.trackPath(kind, track), device)
+            # The bank selected before is kept if the new one can not
+            # be watched
+            self.watches.watch(peer, path, 0)
+            if self.banks.has_key(key) and self.banks[key] != path:
+                self.watches.unwatch(peer.addr, self.banks[key])
+            self.banks[key] = path
+            self.oscEndpoint.sendMessage(message, (peer,))
+
+    def devicelistCB(self, msg, source, kind):
+        if kind == MASTER:
+            track = 0
             do = []
-            devices = LiveUtils.getSong().master_track.devices
-        
-            for i in range(len(devices)):
-                do.append(i)
-                do.append(str(devices[i].name))
-            
-            self.oscEndpoint.send("/live/master/devicelist", tuple(do))            
-            
-            
+        else:
+            track = msg[2]
+            do = [track]
+
+        mirror = self.mirrored()
+        if mirror != None:
+            devices = mirror.track(kind, track).devices
+        else:
+            devices = LiveUtils.getAnyTrack(kind, track).devices
+
+        for i in range(len(devices)):
+            do.append(i)
+            do.append(str(devices[i].name))
+
+        self.oscEndpoint.send(msg[0], tuple(do))
+
     def crossfaderCB(self, msg, source):
-        if len(msg) == 2 or (len(msg) == 3 and msg[2] == "query"):
-            self.oscEndpoint.send("/live/master/crossfader", float(LiveUtils.getSong().master_track.mixer_device.crossfader.value))
-        
-        elif len(msg) == 3:
-            val = msg[2]
-            LiveUtils.getSong().master_track.mixer_device.crossfader.value = val
+        self.oscEndpoint.send("/live/master/crossfader", self.mixerValue(MASTER, 0, "crossfader"))
 
+    def setCrossfaderCB(self, msg, source):
+        LiveUtils.getSong().master_track.mixer_device.crossfader.value = float(msg[2])
 
     def loopStateCB(self, msg, source):
-        type = msg[0] == '/live/clip/loopstate_id' and 1 or 0
-    
+        self.oscEndpoint.send("/live/clip/loopstate", (int(LiveUtils.getClip(msg[2], msg[3]).looping)))
+
+    def loopStateIdCB(self, msg, source):
         trackNumber = msg[2]
         clipNumber = msg[3]
-    
-        if len(msg) == 4:
-            if type == 1:
-                self.oscEndpoint.send("/live/clip/loopstate", (trackNumber, clipNumber, int(LiveUtils.getClip(trackNumber, clipNumber).looping)))
-            else:
-                self.oscEndpoint.send("/live/clip/loopstate", (int(LiveUtils.getClip(trackNumber, clipNumber).looping)))    
-        
-        elif len(msg) == 5:
-            loopState = msg[4]
-            LiveUtils.getClip(trackNumber, clipNumber).looping =  loopState
+        self.oscEndpoint.send("/live/clip/loopstate", (trackNumber, clipNumber, int(LiveUtils.getClip(trackNumber, clipNumber).looping)))
+
+    def setLoopStateCB(self, msg, source):
+        LiveUtils.getClip(msg[2], msg[3]).looping = int(msg[4])
 
     def loopStartCB(self, msg, source):
-        type = msg[0] == '/live/clip/loopstart_id' and 1 or 0
-        
+        self.oscEndpoint.send("/live/clip/loopstart", (float(LiveUtils.getClip(msg[2], msg[3]).loop_start)))
+
+    def loopStartIdCB(self, msg, source):
         trackNumber = msg[2]
         clipNumber = msg[3]
-    
-        if len(msg) == 4:
-            if type == 1:
-                self.oscEndpoint.send("/live/clip/loopstart", (trackNumber, clipNumber, float(LiveUtils.getClip(trackNumber, clipNumber).loop_start)))    
-            else:
-                self.oscEndpoint.send("/live/clip/loopstart", (float(LiveUtils.getClip(trackNumber, clipNumber).loop_start)))    
-    
-        elif len(msg) == 5:
-            loopStart = msg[4]
-            LiveUtils.getClip(trackNumber, clipNumber).loop_start = loopStart
-            
+        self.oscEndpoint.send("/live/clip/loopstart", (trackNumber, clipNumber, float(LiveUtils.getClip(trackNumber, clipNumber).loop_start)))
+
+    def setLoopStartCB(self, msg, source):
+        LiveUtils.getClip(msg[2], msg[3]).loop_start = float(msg[4])
+
     def loopEndCB(self, msg, source):
-        type = msg[0] == '/live/clip/loopend_id' and 1 or 0
-    
+        self.oscEndpoint.send("/live/clip/loopend", (float(LiveUtils.getClip(msg[2], msg[3]).loop_end)))
+
+    def loopEndIdCB(self, msg, source):
         trackNumber = msg[2]
-        clipNumber = msg[3]    
-        if len(msg) == 4:
-            if type == 1:
-                self.oscEndpoint.send("/live/clip/loopend", (trackNumber, clipNumber, float(LiveUtils.getClip(trackNumber, clipNumber).loop_end)))
-            else:
-                self.oscEndpoint.send("/live/clip/loopend", (float(LiveUtils.getClip(trackNumber, clipNumber).loop_end)))    
-        
-        elif len(msg) == 5:
-            loopEnd = msg[4]
-            LiveUtils.getClip(trackNumber, clipNumber).loop_end =  loopEnd
+        clipNumber = msg[3]
+        self.oscEndpoint.send("/live/clip/loopend", (trackNumber, clipNumber, float(LiveUtils.getClip(trackNumber, clipNumber).loop_end)))
+
+    def setLoopEndCB(self, msg, source):
+        LiveUtils.getClip(msg[2], msg[3]).loop_end = float(msg[4])
 
     def quantizationCB(self, msg, source):
-        quant = msg[2]
-        LiveUtils.getSong().clip_trigger_quantization = quant
+        LiveUtils.getSong().clip_trigger_quantization = msg[2]
 
@@ -22,9 +22,25 @@
 
 import Live
 
+# Kinds of tracks, as passed in the (ty) arguments below
+TRACK = 0
+RETURN = 1
+MASTER = 2
+
+# The song and its tracks, scenes and clips as read from Live, cached
+# until invalidateCache() is called.  LiveOSC invalidates the cache on
+# every tick and whenever the tracks or clips of the song change.
+_cache = {}
+
+def invalidateCache():
+    """Forgets the cached song structure"""
+    _cache.clear()
+
 def getSong():
     """Gets a the current Song instance"""
-    return Live.Application.get_application().get_document()
+    if not _cache.has_key('song'):
+        _cache['song'] = Live.Application.get_application().get_document()
+    return _cache['song']
 
 def continuePlaying():
     """Continues Playing"""
@@ -64,11 +80,13 @@ def currentTime(time = None):
 
 def getScenes():
     """Returns a list of scenes"""
-    return getSong().scenes
+    if not _cache.has_key('scenes'):
+        _cache['scenes'] = getSong().scenes
+    return _cache['scenes']
 
 def getScene(num):
     """Returns scene number (num) (starting at 0)"""
-    return getSong().scenes[num]
+    return getScenes()[num]
 
 def launchScene(scene):
     """Launches scene number (scene)"""
@@ -76,11 +94,28 @@ def launchScene(scene):
 
 def getTracks():
     """Returns a list of tracks"""
-    return getSong().visible_tracks
+    if not _cache.has_key('tracks'):
+        _cache['tracks'] = getSong().visible_tracks
+    return _cache['tracks']
 
 def getTrack(num):
     """Returns track number (num) (starting at 0)"""
-    return getSong().visible_tracks[num]
+    return getTracks()[num]
+
+def getReturnTracks():
+    """Returns a list of return tracks"""
+    if not _cache.has_key('returns'):
+        _cache['returns'] = getSong().return_tracks
+    return _cache['returns']
+
+def getAnyTrack(kind, num = 0):
+    """Returns visible track, return track or the master track, depending on (kind)"""
+    if kind == RETURN:
+        return getReturnTracks()[num]
+    elif kind == MASTER:
+        return getSong().master_track
+    else:
+        return getTracks()[num]
 
 def stopTrack(trackNumber):
     """Stops all clips in track number (trackNumber)"""
@@ -120,14 +155,14 @@ def toggleArmTrack(num):
 def muteTrack(track, ty = 0):
     """Mutes track number (num)"""
     if ty == 1:
-        getSong().return_tracks[track].mute = 1
+        getReturnTracks()[track].mute = 1
     else:
         getTrack(track).mute = 1
 
 def unmuteTrack(track, ty = 0):
     """Unmutes track number (num)"""
     if ty == 1:
-        getSong().return_tracks[track].mute = 0
+        getReturnTracks()[track].mute = 0
     else:    
         getTrack(track).mute = 0
     
@@ -142,14 +177,14 @@ def toggleMuteTrack(num):
 def soloTrack(track, ty = 0):
     """Solo's track number (num)"""
     if ty == 1:
-        getSong().return_tracks[track].solo = 1
+        getReturnTracks()[track].solo = 1
     else:
         getTrack(track).solo = 1    
     
 def unsoloTrack(track, ty = 0):
     """Un-solos track number (num)"""
     if ty == 1:
-        getSong().return_tracks[track].solo = 0
+        getReturnTracks()[track].solo = 0
     else:
         getTrack(track).solo = 0
     
@@ -204,10 +239,13 @@ def trackName(track, name = None):
 
 def getClipSlots():
     """Gets a 2D list of all the clip slots in the song"""
+    if _cache.has_key('slots'):
+        return _cache['slots']
     tracks = getTracks()
     clipSlots = []
     for track in tracks:
         clipSlots.append(track.clip_slots)
+    _cache['slots'] = clipSlots
     return clipSlots
 
 def getClips():
@@ -216,13 +254,15 @@ def getClips():
     If there is no clip in a clip slot, None is returned
 
     """
-    tracks = getTracks()
+    if _cache.has_key('clips'):
+        return _cache['clips']
     clips = []
     for track in getClipSlots():
         trackClips = []
         for clipSlot in track:
             trackClips.append(clipSlot.clip)
         clips.append(trackClips)
+    _cache['clips'] = clips
     return clips
 
 def launchClip(track, clip):
@@ -233,10 +273,70 @@ def stopClip(track, clip):
     """Stops clip number (clip) in track (track)""" 
     getClip(track, clip).stop()
 
+def checkRange(what, first, count, total):
+    """Raises an exception unless (count) items starting at (first) are within the (total) items"""
+    if first < 0 or count < 0 or first + count > total:
+        if count == 1:
+            raise Exception(what + ' ' + str(first) + ' out of range, there are ' + str(total))
+        raise Exception(what + 's ' + str(first) + '-' + str(first + count - 1) + ' out of range, there are ' + str(total))
+
+def getClipSlot(track, clip):
+    """Returns clip slot number (clip) in track (track)"""
+    tracks = getTracks()
+    checkRange('track', track, 1, len(tracks))
+    slots = tracks[track].clip_slots
+    checkRange('clip', clip, 1, len(slots))
+    return slots[clip]
+
 def getClip(track, clip):
     """Returns clip number (clip) in track (track)"""
-    clips = getClips()
-    return clips[track][clip]
+    return getClipSlot(track, clip).clip
+
+def getTrackClips(track, first = 0, count = None):
+    """Returns a list of (count) clips of track (track) starting at clip number (first), all of them by default
+
+    If there is no clip in a clip slot, None is returned
+
+    """
+    tracks = getTracks()
+    checkRange('track', track, 1, len(tracks))
+    slots = tracks[track].clip_slots
+    if count == None:
+        count = len(slots) - first
+    checkRange('clip', first, count, len(slots))
+    clips = []
+    for slot in slots[first:first + count]:
+        clips.append(slot.clip)
+    return clips
+
+def getSceneClips(scene, first = 0, count = None):
+    """Returns a list of the clips of scene (scene) in (count) tracks starting at track number (first), all of them by default"""
+    tracks = getTracks()
+    if count == None:
+        count = len(tracks) - first
+    checkRange('track', first, count, len(tracks))
+    clips = []
+    for track in tracks[first:first + count]:
+        slots = track.clip_slots
+        checkRange('clip', scene, 1, len(slots))
+        clips.append(slots[scene].clip)
+    return clips
+
+def getClipBlock(track, clip, width, height):
+    """Returns a list of (height) rows of the clips in (width) tracks, starting at clip (clip) of track (track)"""
+    tracks = getTracks()
+    checkRange('track', track, width, len(tracks))
+    block = []
+    for row in range(height):
+        block.append([])
+    for t in tracks[track:track + width]:
+        slots = t.clip_slots
+        checkRange('clip', clip, height, len(slots))
+        row = 0
+        for slot in slots[clip:clip + height]:
+            block[row].append(slot.clip)
+            row = row + 1
+    return block
 
 def clipName(track, clip, name = None):
     """Gets/changes the name of clip number (clip) in track (track)
@@ -0,0 +1,325 @@
+"""
+LiveWatch, listeners on properties of the Live song that clients ask
+for with /live/watch.
+
+A property is named by a path of the form
+
+    track/<n>/<property>        a visible track
+    return/<n>/<property>       a return track
+    master/<property>           the master track
+
+where <property> is one of name, mute, solo, arm, meter_left,
+meter_right, volume, panning, crossfader (master only), send/<n>,
+device/<n>/param/<n>, device/<n>/params (all parameters of a device),
+device/<n>/bank/<n>[/<size>] (a bank of parameters) or, for visible
+tracks, clip/<n>/<clip property> with the clip
+properties name, color, state, playing_position, loop_start and
+loop_end.
+
+A Live listener is only added for the first client that watches a
+property and removed when the last one stops watching it, so the
+number of listeners follows what the clients watch rather than the
+size of the set.  Changes are only noted by the listeners; the values
+are read and sent once per tick by update().
+"""
+
+import LiveUtils
+import LiveMirror
+import OSC
+from Logger import log
+
+TRACK = LiveUtils.TRACK
+RETURN = LiveUtils.RETURN
+MASTER = LiveUtils.MASTER
+
+# The track properties that are watched on the track itself: the name
+# of the Live property and a function converting its value
+TRACK_PROPERTIES = {
+    "name":        ("name", str),
+    "mute":        ("mute", int),
+    "solo":        ("solo", int),
+    "arm":         ("arm", int),
+    "meter_left":  ("output_meter_left", float),
+    "meter_right": ("output_meter_right", float),
+}
+
+MIXER_PARAMETERS = ("volume", "panning", "crossfader")
+
+# The number of device parameters in a bank, unless a client asks for
+# another size
+BANK_SIZE = 8
+
+# The clip properties: the name of the Live property and a function
+# returning the value from the clip
+CLIP_PROPERTIES = {
+    "name":             ("name", lambda clip: str(clip.name)),
+    "color":            ("color", lambda clip: clip.color),
+    "state":            ("playing_status", LiveMirror.clipState),
+    "playing_position": ("playing_position", lambda clip: float(clip.playing_position)),
+    "loop_start":       ("loop_start", lambda clip: float(clip.loop_start)),
+    "loop_end":         ("loop_end", lambda clip: float(clip.loop_end)),
+}
+
+def getItem(what, items, num):
+    LiveUtils.checkRange(what, num, 1, len(items))
+    return items[num]
+
+def parameterTarget(path, param):
+    return (path, param, "value", lambda :float(param.value))
+
+def family(path):
+    """Returns the feature gate of the LiveConfig family that the property (path) belongs to, None if there is none"""
+    if path.endswith("/meter_left") or path.endswith("/meter_right"):
+        return "meters"
+    if path.endswith("/playing_position"):
+        return "positions"
+    if path.find("/device/") != -1:
+        return "params"
+    if path.endswith("/name") or path.endswith("/color"):
+        return "names"
+    return None
+
+def trackPath(kind, num = 0):
+    """Returns the path of visible track, return track or the master track number (num), depending on (kind)"""
+    if kind == MASTER:
+        return "master"
+    if kind == RETURN:
+        return "return/" + str(num)
+    return "track/" + str(num)
+
+def bankRange(params, bank, size):
+    """Returns the range of the numbers of the parameters in (bank) of (size) parameters, given the number of parameters (params)"""
+    if size < 1:
+        raise Exception("invalid bank size " + str(size))
+    LiveUtils.checkRange('bank', bank, 1, (params + size - 1) / size)
+    return range(bank * size, min((bank + 1) * size, params))
+
+def resolve(path):
+    """Returns the properties named by (path) as a list of (path, object, property, getter) tuples
+
+    Each path in the result names a single property, the getter returns its current value.
+    """
+    parts = path.strip("/").split("/")
+    try:
+        if parts[0] == "master":
+            track = LiveUtils.getAnyTrack(MASTER)
+            base = "master"
+            kind = MASTER
+            parts = parts[1:]
+        elif parts[0] == "track" or parts[0] == "return":
+            if parts[0] == "track":
+                kind = TRACK
+                tracks = LiveUtils.getTracks()
+            else:
+                kind = RETURN
+                tracks = LiveUtils.getReturnTracks()
+            track = getItem(parts[0], tracks, int(parts[1]))
+            base = parts[0] + "/" + parts[1]
+            parts = parts[2:]
+        else:
+            raise Exception("unknown property path " + path)
+
+        name = parts[0]
+        if len(parts) == 1 and TRACK_PROPERTIES.has_key(name):
+            prop, convert = TRACK_PROPERTIES[name]
+            if name == "arm" and not track.can_be_armed:
+                raise Exception(base + " can not be armed")
+            return [(base + "/" + name, track, prop, lambda :convert(getattr(track, prop)))]
+
+        if len(parts) == 1 and name in MIXER_PARAMETERS:
+            if name == "crossfader" and kind != MASTER:
+                raise Exception("only the master track has a crossfader")
+            return [parameterTarget(base + "/" + name, getattr(track.mixer_device, name))]
+
+        if len(parts) == 2 and name == "send":
+            send = getItem("send", track.mixer_device.sends, int(parts[1]))
+            return [parameterTarget(base + "/send/" + parts[1], send)]
+
+        if len(parts) >= 3 and name == "device":
+            device = getItem("device", track.devices, int(parts[1]))
+            base = base + "/device/" + parts[1]
+            params = device.parameters
+            if len(parts) == 3 and parts[2] == "params":
+                targets = []
+                for pid in range(len(params)):
+                    targets.append(parameterTarget(base + "/param/" + str(pid), params[pid]))
+                return targets
+            if len(parts) == 4 and parts[2] == "param":
+                return [parameterTarget(base + "/param/" + parts[3], getItem("param", params, int(parts[3])))]
+            if len(parts) in (4, 5) and parts[2] == "bank":
+                size = BANK_SIZE
+                if len(parts) == 5:
+                    size = int(parts[4])
+                targets = []
+                for pid in bankRange(len(params), int(parts[3]), size):
+                    targets.append(parameterTarget(base + "/param/" + str(pid), params[pid]))
+                return targets
+
+        if len(parts) == 3 and name == "clip" and kind == TRACK and CLIP_PROPERTIES.has_key(parts[2]):
+            clip = getItem("clip", track.clip_slots, int(parts[1])).clip
+            if clip == None:
+                raise Exception(base + " has no clip in slot " + parts[1])
+            prop, get = CLIP_PROPERTIES[parts[2]]
+            return [(base + "/clip/" + parts[1] + "/" + parts[2], clip, prop, lambda :get(clip))]
+    except (IndexError, ValueError):
+        pass
+
+    raise Exception("unknown property path " + path)
+
+class Watch:
+    """The listener on one property and the number of times each peer watches it"""
+    def __init__(self, watches, path, obj, prop, get):
+        self.obj = obj
+        self.prop = prop
+        self.get = get
+        self.peers = {}
+        self.callback = lambda :watches.changed(path)
+        getattr(obj, "add_" + prop + "_listener")(self.callback)
+
+    def remove(self):
+        # Objects that have been deleted from the song compare equal to None
+        if self.obj != None and getattr(self.obj, self.prop + "_has_listener")(self.callback) == 1:
+            getattr(self.obj, "remove_" + self.prop + "_listener")(self.callback)
+
+class LiveWatches:
+    """The properties watched by the peers of an OSCEndpoint, as far as the LiveConfig (config) allows"""
+    def __init__(self, oscEndpoint, config):
+        self.oscEndpoint = oscEndpoint
+        self.config = config
+        # Watches indexed by the path of their property, the paths that
+        # each peer asked for with the property paths they resolved to,
+        # and the paths of the properties that changed since update()
+        self.watches = {}
+        self.requests = {}
+        self.pending = {}
+
+    def watch(self, peer, path, initial = 1):
+        """Makes (peer) watch the properties named by (path) and sends their current values to it unless (initial) is false"""
+        targets = resolve(path)
+        for target in targets:
+            if not self.allowed(target[0]):
+                raise Exception(family(target[0]) + " are switched off")
+        self.unwatch(peer.addr, path)
+
+        paths = []
+        for target in targets:
+            self.addWatch(peer.addr, target)
+            paths.append(target[0])
+        self.requests.setdefault(peer.addr, {})[path] = paths
+        if not initial:
+            return
+
+        bundle = OSC.OSCBundle()
+        for target in targets:
+            bundle.append("/live/watch", (target[0], target[3]()))
+        self.oscEndpoint.sendMessage(bundle, (peer,))
+
+    def unwatch(self, addr, path = None):
+        """Stops the peer with the address (addr) watching (path), or everything if it is None"""
+        requests = self.requests.get(addr, {})
+        if path == None:
+            paths = requests.keys()
+        elif requests.has_key(path):
+            paths = [path]
+        else:
+            paths = []
+
+        for path in paths:
+            for target in requests.pop(path):
+                self.dropWatch(addr, target)
+        if not requests and self.requests.has_key(addr):
+            del self.requests[addr]
+
+    def allowed(self, path):
+        gate = family(path)
+        return gate == None or self.config.enabled(gate)
+
+    def addWatch(self, addr, target):
+        path, obj, prop, get = target
+        if not self.watches.has_key(path):
+            self.watches[path] = Watch(self, path, obj, prop, get)
+        peers = self.watches[path].peers
+        peers[addr] = peers.get(addr, 0) + 1
+
+    def dropWatch(self, addr, path):
+        watch = self.watches[path]
+        watch.peers[addr] = watch.peers[addr] - 1
+        if watch.peers[addr] == 0:
+            del watch.peers[addr]
+        if not watch.peers:
+            watch.remove()
+            del self.watches[path]
+
+    def changed(self, path):
+        self.pending[path] = 1
+
+    def clear(self):
+        """Removes all watches"""
+        for watch in self.watches.values():
+            watch.remove()
+        self.watches = {}
+        self.requests = {}
+        self.pending = {}
+
+    def count(self):
+        """Returns the number of Live listeners"""
+        return len(self.watches)
+
+    def update(self):
+        """Sends the changed values of the watched properties as /live/watch (string path, value), called once per tick"""
+        for addr in self.requests.keys():
+            if not self.oscEndpoint.peers.has_key(addr):
+                self.unwatch(addr)
+
+        pending = self.pending
+        self.pending = {}
+        for path in pending:
+            if not self.watches.has_key(path):
+                continue
+            watch = self.watches[path]
+            try:
+                value = watch.get()
+            except Exception, e:
+                # The object has been deleted from the song, rebind()
+                # drops the watch at the next refresh
+                log("LiveWatch: can not read " + path + ": " + str(e))
+                continue
+            peers = []
+            for addr in watch.peers:
+                peers.append(self.oscEndpoint.peers[addr])
+            self.oscEndpoint.sendMessage(OSC.OSCMessage("/live/watch", (path, value)), peers)
+
+    def rebind(self):
+        """Resolves the watched paths again after the structure of the song changed
+
+        Watches whose property is still the same Live object are kept, properties that no longer
+        exist or whose family has been switched off are no longer watched and those that moved to
+        another object are sent again.
+        """
+        old = self.watches
+        self.watches = {}
+        requests = self.requests
+        self.requests = {}
+        for addr in requests:
+            for path in requests[addr]:
+                try:
+                    targets = resolve(path)
+                except Exception:
+                    continue
+                paths = []
+                for target in targets:
+                    if not self.allowed(target[0]):
+                        continue
+                    watch = old.get(target[0])
+                    if watch != None and watch.obj == target[1]:
+                        watch.peers = {}
+                        self.watches[target[0]] = watch
+                        del old[target[0]]
+                    elif not self.watches.has_key(target[0]):
+                        self.pending[target[0]] = 1
+                    self.addWatch(addr, target)
+                    paths.append(target[0])
+                self.requests.setdefault(addr, {})[path] = paths
+
+        for watch in old.values():
+            watch.remove()
@@ -50,23 +50,137 @@ def hexDump(bytes):
     if(len(bytes) % 8 != 0):
         print string.rjust("", 11), repr(bytes[i-7:i+1])
 
+# Typetag plans, indexed by typetag string.  A plan is a tuple of
+# (tags, fixed) steps.  For a run of fixed width arguments, tags holds
+# the run's typetags and fixed the compiled struct.Struct that packs or
+# unpacks the whole run in one call.  Variable length arguments get a
+# step of their own with tags "s" or "b" and fixed set to None.
+_MAXPLANS = 100
+_plans = {}
+
+_fixedFormats = { "i": "i", "f": "f" }
+
+_intStruct = struct.Struct(">i")
+_floatStruct = struct.Struct(">f")
+_timetagStruct = struct.Struct(">ll")
+
+def compileTypetags(typetags):
+    """Returns the plan for a typetag string like ",iif"."""
+    try:
+        return _plans[typetags]
+    except KeyError:
+        pass
+
+    plan = []
+    run = ""
+    for tag in typetags[1:]:
+        if _fixedFormats.has_key(tag):
+            run = run + tag
+        elif tag == "s" or tag == "b":
+            if run != "":
+                plan.append((run, struct.Struct(">" + _compileRun(run))))
+                run = ""
+            plan.append((tag, None))
+        else:
+            raise Exception("don't know how to handle OSC typetag " + repr(tag))
+    if run != "":
+        plan.append((run, struct.Struct(">" + _compileRun(run))))
+
+    if len(_plans) >= _MAXPLANS:
+        _plans.clear()
+    plan = tuple(plan)
+    _plans[typetags] = plan
+    return plan
+
+def _compileRun(run):
+    format = ""
+    for tag in run:
+        format = format + _fixedFormats[tag]
+    return format
+
+def OSCString(next):
+    """Returns next as a null terminated string padded to a multiple
+    of four bytes."""
+    return next + "\0" * (4 - (len(next) & 3))
+
+def OSCCountedBlob(next):
+    """Returns next as a counted blob padded to a multiple of four
+    bytes."""
+    return _intStruct.pack(len(next)) + next + "\0" * (-len(next) & 3)
+
+# Typetags of the Python types that OSCMessage encodes without a hint
+_argumentTags = { str: "s", int: "i", float: "f" }
+
+# Compiled message headers, indexed by (address, typetags).  Each entry
+# is a (header, packer) tuple.  header holds the padded address and
+# typetags.  For messages that have only fixed width arguments, packer
+# is a struct.Struct that emits header and arguments in one call,
+# otherwise it is None.
+_MAXHEADERS = 500
+_headers = {}
+
+def compileHeader(address, typetags):
+    """Returns the (header, packer) tuple for address and typetags."""
+    key = (address, typetags)
+    try:
+        return _headers[key]
+    except KeyError:
+        pass
+
+    header = OSCString(address) + OSCString(typetags)
+    plan = compileTypetags(typetags)
+    packer = None
+    if len(plan) == 1 and plan[0][1] != None:
+        packer = struct.Struct(">%ds" % len(header) + _compileRun(plan[0][0]))
+
+    if len(_headers) >= _MAXHEADERS:
+        _headers.clear()
+    _headers[key] = (header, packer)
+    return (header, packer)
+
+def encodeOSC(address, typetags, arguments):
+    """Returns the binary OSC message for address with the given
+    typetags and the matching sequence of arguments."""
+    header, packer = compileHeader(address, typetags)
+    if packer != None:
+        return packer.pack(header, *arguments)
+
+    parts = [header]
+    i = 0
+    for tags, fixed in compileTypetags(typetags):
+        if fixed != None:
+            n = i + len(tags)
+            parts.append(fixed.pack(*arguments[i:n]))
+            i = n
+        elif tags == "s":
+            parts.append(OSCString(arguments[i]))
+            i = i + 1
+        else:
+            parts.append(OSCCountedBlob(arguments[i]))
+            i = i + 1
+    return "".join(parts)
+
 class OSCMessage:
     """Builds typetagged OSC messages."""
     def __init__(self, address='', msg=()):
-        self.address  = address
-        self.typetags = ","
-        self.message  = ""
+        self.address   = address
+        self.typetags  = ","
+        self.arguments = []
+        self.binary    = None
 
         if type(msg) in (str, int, float):
-           self.append(msg)
+            self.append(msg)
         elif type(msg) in (list,tuple):
-             for m in msg:
-                if type(m) not in (str,int,float):
+            tags = []
+            for m in msg:
+                if not _argumentTags.has_key(type(m)):
                     log("don't know how to encode message element " + str(m) + " " + str(type(m)))
                     return
-                self.append(m)
+                tags.append(_argumentTags[type(m)])
+            self.typetags = "," + "".join(tags)
+            self.arguments = list(msg)
         else:
-            log("don't know how to encode message " + str(m) + " " + str(type(m)))
+            log("don't know how to encode message " + str(msg) + " " + str(type(msg)))
             return
 
     def append(self, argument, typehint = None):
@@ -77,18 +191,21 @@ class OSCMessage:
         pass in 'b' as typehint."""
 
         if typehint == 'b':
-            binary = OSCBlob(argument)
+            tag = 'b'
+        elif _argumentTags.has_key(type(argument)):
+            tag = _argumentTags[type(argument)]
         else:
-            binary = OSCArgument(argument)
+            raise Exception("don't know how to encode " + str(argument) + " as OSC argument, type=" + str(type(argument)))
 
-        self.typetags = self.typetags + binary[0]
-        self.message = self.message + binary[1]
+        self.typetags = self.typetags + tag
+        self.arguments.append(argument)
+        self.binary = None
 
     def getBinary(self):
         """Returns the binary message (so far) with typetags."""
-        address  = OSCArgument(self.address)[1]
-        typetags = OSCArgument(self.typetags)[1]
-        return address + typetags + self.message
+        if self.binary == None:
+            self.binary = encodeOSC(self.address, self.typetags, self.arguments)
+        return self.binary
 
     def __repr__(self):
         return self.getBinary()
@@ -124,11 +241,26 @@ class OSCBundle:
             raise Exception('invalid type of first argument to OSCBundle.append(), need address string or OSCMessage, not ', str(type(address)))
 
     def getBinary(self):
-        retval = OSCArgument('#bundle')[1] + abs_to_timestamp(self.when)
+        parts = [OSCString('#bundle'), abs_to_timestamp(self.when)]
         for item in self.items:
             binary = item.getBinary()
-            retval = retval + OSCArgument(len(binary))[1] + binary
-        return retval
+            parts.append(_intStruct.pack(len(binary)))
+            parts.append(binary)
+        return "".join(parts)
+
+# Time tag meaning "immediately"
+IMMEDIATELY = "\0\0\0\0\0\0\0\1"
+
+def joinBundle(binaries, when = IMMEDIATELY):
+    """Joins a list of binary OSC messages into one bundle, or returns
+    the message itself if there is only one."""
+    if len(binaries) == 1:
+        return binaries[0]
+    parts = [OSCString('#bundle'), when]
+    for binary in binaries:
+        parts.append(_intStruct.pack(len(binary)))
+        parts.append(binary)
+    return "".join(parts)
 
 def readString(data):
     length   = string.find(data,"\0")
@@ -175,9 +307,7 @@ def OSCBlob(next):
     returning a (typetag, data) tuple."""
 
     if type(next) == type(""):
-        length = len(next)
-        padded = math.ceil((len(next)) / 4.0) * 4
-        binary = struct.pack(">i%ds" % (padded), length, next)
+        binary = OSCCountedBlob(next)
         tag    = 'b'
     else:
         tag    = ''
@@ -191,14 +321,13 @@ def OSCArgument(next):
     (typetag, data) tuple."""
     
     if type(next) == type(""):        
-        OSCstringLength = math.ceil((len(next)+1) / 4.0) * 4
-        binary  = struct.pack(">%ds" % (OSCstringLength), next)
+        binary  = OSCString(next)
         tag = "s"
     elif type(next) == type(42.5):
-        binary  = struct.pack(">f", next)
+        binary  = _floatStruct.pack(next)
         tag = "f"
     elif type(next) == type(13):
-        binary  = struct.pack(">i", next)
+        binary  = _intStruct.pack(next)
         tag = "i"
     else:
         raise Exception("don't know how to encode " + str(next) + " as OSC argument, type=" + str(type(next)))
@@ -224,48 +353,228 @@ def parseArgs(args):
         parsed.append(interpretation)
     return parsed
 
-def decodeOSC(data):
-    """Converts a typetagged OSC message to a Python list."""
-    table = {"i":readInt, "f":readFloat, "s":readString, "b":readBlob}
-    decoded = []
-    address,  rest = readString(data)
-    typetags = ""
+def readStringAt(data, offset, end):
+    """Reads the padded string starting at offset, returning a
+    (string, next offset) tuple."""
+    zero = data.find("\0", offset, end)
+    if zero < 0:
+        raise Exception("unterminated OSC string at offset " + str(offset))
+    return (data[offset:zero], offset + ((zero - offset + 4) & ~3))
+
+def readBlobAt(data, offset, end):
+    """Reads the counted, padded blob starting at offset, returning a
+    (blob, next offset) tuple."""
+    if offset + 4 > end:
+        raise Exception("too few bytes for blob size at offset " + str(offset))
+    length = _intStruct.unpack_from(data, offset)[0]
+    start = offset + 4
+    if length < 0 or start + length > end:
+        raise Exception("invalid OSC blob size " + str(length) + " at offset " + str(offset))
+    return (data[start:start + length], start + ((length + 3) & ~3))
+
+def decodeAt(data, offset, end):
+    """Decodes the typetagged OSC message or bundle occupying
+    data[offset:end] without copying the remainder of the packet
+    for every argument."""
+    address, offset = readStringAt(data, offset, end)
 
     if address == "#bundle":
-        time, rest = readLong(rest)
-        decoded.append(address)
-        decoded.append(time)
-        while len(rest)>0:
-            length, rest = readInt(rest)
-            decoded.append(decodeOSC(rest[:length]))
-            rest = rest[length:]
-
-    elif len(rest)>0:
-        typetags, rest = readString(rest)
-        decoded.append(address)
-        decoded.append(typetags)
-        if(typetags[0] == ","):
-            for tag in typetags[1:]:
-                value, rest = table[tag](rest)                
-                decoded.append(value)
+        if offset + 8 > end:
+            raise Exception("too few bytes for bundle time tag")
+        high, low = _timetagStruct.unpack_from(data, offset)
+        offset = offset + 8
+        decoded = [address, (long(high) << 32) + low]
+        while offset < end:
+            if offset + 4 > end:
+                raise Exception("too few bytes for bundle element size")
+            length = _intStruct.unpack_from(data, offset)[0]
+            offset = offset + 4
+            if length < 0 or offset + length > end:
+                raise Exception("invalid bundle element size " + str(length))
+            decoded.append(decodeAt(data, offset, offset + length))
+            offset = offset + length
+        return decoded
+
+    if offset >= end:
+        return [address, ","]
+
+    typetags, offset = readStringAt(data, offset, end)
+    decoded = [address, typetags]
+    if typetags[:1] != ",":
+        print "Oops, typetag lacks the magic ,"
+        return decoded
+
+    for tags, fixed in compileTypetags(typetags):
+        if fixed != None:
+            if offset + fixed.size > end:
+                raise Exception("too few bytes for arguments " + typetags)
+            decoded.extend(fixed.unpack_from(data, offset))
+            offset = offset + fixed.size
+        elif tags == "s":
+            value, offset = readStringAt(data, offset, end)
+            decoded.append(value)
         else:
-            print "Oops, typetag lacks the magic ,"
-    else:
-        decoded.append(address)
-        decoded.append(',')
+            value, offset = readBlobAt(data, offset, end)
+            decoded.append(value)
 
-    # return only the data
     return decoded
 
+def decodeOSC(data):
+    """Converts a typetagged OSC message to a Python list.
+
+    data may be a string or a buffer object.  The packet is walked
+    with an integer offset, see decodeAt()."""
+    if type(data) != str:
+        data = str(data)
+    return decodeAt(data, 0, len(data))
+
+def isPattern(address):
+    """Returns true if address contains OSC pattern characters."""
+    for c in address:
+        if c in "*?[{":
+            return True
+    return False
+
+def _matchClass(chars, c):
+    negate = chars[:1] == "!"
+    if negate:
+        chars = chars[1:]
+    found = False
+    i = 0
+    while i < len(chars):
+        if i + 2 < len(chars) and chars[i + 1] == "-":
+            if chars[i] <= c <= chars[i + 2]:
+                found = True
+            i = i + 3
+        else:
+            if chars[i] == c:
+                found = True
+            i = i + 1
+    return found != negate
+
+def _matchFrom(pattern, p, name, n):
+    while p < len(pattern):
+        c = pattern[p]
+        if c == "*":
+            while p < len(pattern) and pattern[p] == "*":
+                p = p + 1
+            if p == len(pattern):
+                return True
+            for i in range(n, len(name) + 1):
+                if _matchFrom(pattern, p, name, i):
+                    return True
+            return False
+        elif c == "?":
+            if n >= len(name):
+                return False
+        elif c == "[":
+            close = pattern.find("]", p + 1)
+            if close < 0 or n >= len(name) or not _matchClass(pattern[p + 1:close], name[n]):
+                return False
+            p = close
+        elif c == "{":
+            close = pattern.find("}", p + 1)
+            if close < 0:
+                return False
+            for alternative in pattern[p + 1:close].split(","):
+                if name.startswith(alternative, n) and _matchFrom(pattern, close + 1, name, n + len(alternative)):
+                    return True
+            return False
+        elif n >= len(name) or name[n] != c:
+            return False
+        p = p + 1
+        n = n + 1
+    return n == len(name)
+
+def matchSegment(pattern, name):
+    """Matches one part of an OSC address against an OSC 1.0 pattern
+    part, supporting *, ?, [abc], [a-z], [!abc] and {foo,bar}."""
+    return _matchFrom(pattern, 0, name, 0)
+
+def matchAddress(pattern, address):
+    """Matches a complete OSC address against an OSC address pattern."""
+    patternParts = pattern.split("/")
+    addressParts = address.split("/")
+    if len(patternParts) != len(addressParts):
+        return False
+    for i in range(len(patternParts)):
+        if not matchSegment(patternParts[i], addressParts[i]):
+            return False
+    return True
+
+def expandTypetags(typetags):
+    """Expands a route signature into the typetag strings it accepts.
+    In addition to the OSC typetags, signatures may use "n" for a
+    number that can be sent either as int or as float, and "x" for an
+    integer that can be sent either way but is passed on as int."""
+    expanded = [","]
+    for tag in typetags[1:]:
+        if tag == "n" or tag == "x":
+            alternatives = "if"
+        else:
+            alternatives = tag
+        expanded = [prefix + alternative for prefix in expanded for alternative in alternatives]
+    return expanded
+
+class Router:
+    """Dispatches the messages sent to one address to the callback
+    registered for their typetags, see CallbackManager.addRoute().
+    Messages with typetags that no route accepts are rejected before
+    any callback is called."""
+    def __init__(self, address):
+        self.address = address
+        self.routes = {}
+        self.default = None
+
+    def add(self, typetags, callback):
+        if typetags == "*":
+            self.default = callback
+        else:
+            for tags in expandTypetags(typetags):
+                # Positions in the message of the indices sent as float
+                coerce = [i + 1 for i in range(1, len(tags)) if typetags[i] == "x" and tags[i] == "f"]
+                self.routes[tags] = (callback, coerce)
+
+    def __call__(self, message, source):
+        try:
+            callback, coerce = self.routes[message[1]]
+        except KeyError:
+            if self.default == None:
+                raise Exception("no handler for " + message[0] + " with typetags " + message[1])
+            callback, coerce = self.default, []
+        if coerce:
+            message = list(message)
+            for i in coerce:
+                message[i] = int(message[i])
+        callback(message, source)
+
+class AddressNode:
+    """A node in the CallbackManager's address trie.  children maps
+    the next address part to its node."""
+    def __init__(self):
+        self.children = {}
+        self.callback = None
+
 class CallbackManager:
     """This utility class maps OSC addresses to callables.
 
     The CallbackManager calls its callbacks with a list
     of decoded OSC arguments, including the address and
-    the typetags as the first two arguments."""
+    the typetags as the first two arguments.
+
+    Messages are dispatched by exact address lookup first.
+    Addresses that contain OSC pattern characters are matched
+    against a trie of the registered addresses instead, and
+    the callback of every matching address is called with the
+    matched address as first argument.  Pattern lookups are
+    memoized until the set of callbacks changes."""
+
+    MAX_MATCHES = 500
 
     def __init__(self):
         self.callbacks = {}
+        self.root = AddressNode()
+        self.matches = {}
         self.add("#bundle", self.unbundler)
 
     def handle(self, data, source):
@@ -276,7 +585,51 @@ class CallbackManager:
     def dispatch(self, message, source):
         """Sends decoded OSC data to an appropriate calback"""
         address = message[0]
-        self.callbacks[address](message, source)
+        try:
+            callback = self.callbacks[address]
+        except KeyError:
+            if not isPattern(address):
+                raise
+            matches = self.match(address)
+            if len(matches) == 0:
+                raise KeyError(address)
+            for matched, callback in matches:
+                callback([matched] + message[1:], source)
+            return
+        callback(message, source)
+
+    def match(self, pattern):
+        """Returns a tuple of (address, callback) pairs for all
+        registered addresses that match the pattern."""
+        try:
+            return self.matches[pattern]
+        except KeyError:
+            pass
+
+        found = []
+        self.collect(self.root, pattern.split("/"), 0, [], found)
+        found = tuple(found)
+
+        if len(self.matches) >= self.MAX_MATCHES:
+            self.matches.clear()
+        self.matches[pattern] = found
+        return found
+
+    def collect(self, node, parts, i, path, found):
+        if i == len(parts):
+            if node.callback != None:
+                found.append(("/".join(path), node.callback))
+            return
+
+        part = parts[i]
+        if isPattern(part):
+            names = node.children.keys()
+            names.sort()
+            for name in names:
+                if matchSegment(part, name):
+                    self.collect(node.children[name], parts, i + 1, path + [name], found)
+        elif node.children.has_key(part):
+            self.collect(node.children[part], parts, i + 1, path + [part], found)
 
     def add(self, address, callback):
         """Adds a callback to our set of callbacks,
@@ -287,6 +640,25 @@ class CallbackManager:
         else:
             self.callbacks[address] = callback
 
+        node = self.root
+        for part in address.split("/"):
+            if not node.children.has_key(part):
+                node.children[part] = AddressNode()
+            node = node.children[part]
+        node.callback = callback
+        self.matches.clear()
+
+    def addRoute(self, address, typetags, callback):
+        """Adds a callback for the messages to address that have the
+        given typetags.  typetags is a signature as accepted by
+        expandTypetags(), or "*" to accept messages with any typetags
+        that no other route of the address takes."""
+        router = self.callbacks.get(address)
+        if not isinstance(router, Router):
+            router = Router(address)
+            self.add(address, router)
+        router.add(typetags, callback)
+
     def unbundler(self, messages, source):
         """Dispatch the messages in a decoded bundle."""
         # first two elements are #bundle and the time tag, rest are messages.
@@ -376,10 +748,17 @@ if __name__ == "__main__":
     
     c = CallbackManager()
     c.add("/print", printingCallback)
+    c.add("/foo/play", printingCallback)
+    c.add("/foo", printingCallback)
     
     c.handle(message.getBinary(), None)
     
     c.handle(print1.getBinary(), None)
 
+    print "Testing address patterns."
+    c.add("/foo/stop", printingCallback)
+    c.handle(OSCMessage("/foo/{play,stop}", 1).getBinary(), None)
+    c.handle(OSCMessage("/f?o/[!s]*", 2).getBinary(), None)
+
     print "sending a bundle to the callback manager"
     c.handle(bundlebinary, None)
@@ -62,6 +62,7 @@ Based on the original RemixNet.py written by Nathan Ramella (nar@remix.net)
 """
 import sys
 import errno
+import time
 import Live
 from Logger import log
 
@@ -83,20 +84,175 @@ else:
             import socket
 
 import OSC 
-        
+
+# The size of a /remix/seq (int first, int last) message in a bundle
+SEQ_HEADER_SIZE = 28
+
+def packSequenced(binaries, sequences, maxSize):
+    """
+    Packs binary OSC messages into datagrams of at most maxSize bytes,
+    keeping their order.  Messages that share a datagram are sent as a
+    bundle.  A message is never split, so a datagram holding a single
+    message is sent as the plain message, even if it is larger than
+    maxSize.  sequences holds the sequence number of each message, or
+    0 if it is not journaled.  Every datagram that carries journaled
+    messages starts with a /remix/seq (first, last) message, and the
+    journaled messages of a datagram have consecutive sequence
+    numbers, so that a receiver can tell which messages it has lost.
+    """
+    datagrams = []
+    start = 0
+    size = 16 + SEQ_HEADER_SIZE
+    last = 0
+    for i in range(len(binaries)):
+        length = len(binaries[i]) + 4
+        seq = sequences[i]
+        if i > start and (size + length > maxSize or (seq and last and seq != last + 1)):
+            datagrams.append(joinSequenced(binaries[start:i], sequences[start:i]))
+            start = i
+            size = 16 + SEQ_HEADER_SIZE
+            last = 0
+        size = size + length
+        if seq:
+            last = seq
+    if start < len(binaries):
+        datagrams.append(joinSequenced(binaries[start:], sequences[start:]))
+    return datagrams
+
+def joinSequenced(binaries, sequences):
+    first = 0
+    last = 0
+    for seq in sequences:
+        if seq:
+            if not first:
+                first = seq
+            last = seq
+    if first:
+        binaries = [OSC.OSCMessage('/remix/seq', (first, last)).getBinary()] + binaries
+    return OSC.joinBundle(binaries)
+
+class OSCPeer:
+    """
+    A client that receives the OSC messages we send.  The host name
+    is resolved once, when the peer is registered, and the peer has
+    its own queue of outbound messages.
+
+    State updates sent to the peer are numbered with the peer's own
+    sequence numbers and kept in its journal, the list of the last
+    (seq, binary) pairs sent, so that they can be sent again when the
+    peer asks for them with /remix/resync.
+
+    subscriptions is None if the peer receives all messages, otherwise
+    it is the list of address prefixes and patterns that the peer has
+    subscribed to.  exclusions lists the prefixes and patterns that a
+    peer receiving all messages has unsubscribed from.  Messages in the
+    /remix/ name space are always sent.
+    """
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.addr = (socket.gethostbyname(host), port)
+        self.outbound = []
+        self.sequences = []
+        self.seq = 0
+        self.journal = []
+        self.subscriptions = None
+        self.exclusions = []
+
+    def queue(self, binary, seq = 0):
+        self.outbound.append(binary)
+        self.sequences.append(seq)
+
+    def queueJournaled(self, binary, journalSize):
+        """
+        Queues a state update with the next sequence number and adds it
+        to the journal, which keeps at least the last journalSize
+        updates.
+        """
+        self.seq = self.seq + 1
+        self.journal.append((self.seq, binary))
+        if len(self.journal) >= 2 * journalSize:
+            del self.journal[:-journalSize]
+        self.queue(binary, self.seq)
+
+    def journalSince(self, seq):
+        """
+        Returns the journal entries after sequence number seq, or None
+        if some of them have already been dropped from the journal.
+        """
+        if seq >= self.seq:
+            return []
+        if len(self.journal) == 0 or self.journal[0][0] > seq + 1:
+            return None
+        return self.journal[len(self.journal) - (self.seq - seq):]
+
+    def subscribe(self, prefix):
+        if self.subscriptions == None:
+            # The first subscription ends receiving all messages, and
+            # with it the exclusions
+            self.subscriptions = []
+            self.exclusions = []
+        if prefix not in self.subscriptions:
+            self.subscriptions.append(prefix)
+
+    def unsubscribe(self, prefix):
+        if self.subscriptions == None:
+            if prefix not in self.exclusions:
+                self.exclusions.append(prefix)
+        elif prefix in self.subscriptions:
+            self.subscriptions.remove(prefix)
+
+    def accepts(self, address):
+        if address.startswith('/remix/'):
+            return True
+        if self.subscriptions == None:
+            return not self.matchesAny(self.exclusions, address)
+        return self.matchesAny(self.subscriptions, address)
+
+    def matchesAny(self, prefixes, address):
+        for prefix in prefixes:
+            if OSC.isPattern(prefix):
+                if OSC.matchAddress(prefix, address):
+                    return True
+            elif address.startswith(prefix):
+                return True
+        return False
+
+    def __repr__(self):
+        return self.host + ':' + str(self.port)
+
 class OSCEndpoint:
         
-    def __init__(self, remoteHost='localhost', remotePort=9001, localHost='', localPort=9000, ):
+    def __init__(self, remoteHost='localhost', remotePort=9001, localHost='', localPort=9000, maxPacketSize=1400,
+                 receiveBudget=0.01, maxReceivePackets=200, maxBacklog=2000,
+                 journalSize=1024):
         """
         This is the main class we the use as a nexus point in this module.
 
         - remoteHost and remotePort define the address of the peer
           that we send data to by default.  It can be changed, at run
-          time, using the /remix/set_peer OSC message.
+          time, using the /remix/set_peer OSC message.  More peers
+          can be added with /remix/add_peer, every message is sent to
+          all of them.
 
         - localHost and localPort define the address that we are
           listening to for incoming OSC packets.  By default, we are
           listening on all interfaces with port 9000.
+
+        - maxPacketSize is the maximum payload size of the datagrams
+          that we send.  Outgoing messages are collected and sent
+          once per tick by flush(), packed into bundles that fit into
+          one datagram of this size so that they are not fragmented.
+
+        - receiveBudget is the time in seconds and maxReceivePackets
+          the number of packets that processIncomingUDP() may spend
+          on handling incoming messages per call.  Packets that are
+          not handled wait in a queue of at most maxBacklog packets
+          for the next call.  Once the queue is full or half the
+          time is spent, further packets are left in the socket.
+
+        - journalSize is the number of state updates per peer that are
+          kept for /remix/resync.
         
         By default we define and set callbacks for some utility
         addresses:
@@ -104,6 +260,10 @@ class OSCEndpoint:
         /remix/echo - Echos back the string argument to the peer.
         /remix/time - Returns time.time() (time in float seconds)
         /remix/set_peer - Reconfigures the peer address which we send OSC messages to
+        /remix/add_peer - Adds a peer address which we send OSC messages to
+        /remix/remove_peer - Removes a peer address
+        /remix/stats - Returns the receive backlog and time spent per tick
+        /remix/resync - Sends the state updates a peer has missed
         """
 
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -111,23 +271,59 @@ class OSCEndpoint:
         self.localAddr = (localHost, localPort)
         self.socket.bind(self.localAddr)
 
-        self.remoteAddr = (remoteHost, remotePort)
+        # The peers we send to, indexed by their resolved address, and
+        # the peers that receive a given address, see recipients()
+        self.peers = {}
+        self.recipientCache = {}
+        self.addPeer(remoteHost, remotePort)
+
+        # Outbound messages queued with sendCoalesced(), indexed by
+        # their key, and the keys in the order they were first queued
+        self.pending = {}
+        self.pendingKeys = []
+
+        # The last value of each state update, indexed like pending,
+        # and the keys in the order they were first sent
+        self.journalSize = journalSize
+        self.state = {}
+        self.stateKeys = []
+
+        self.maxPacketSize = maxPacketSize
 
-        log('OSCEndpoint starting, local address ' + str(self.localAddr) + ' remote address ' + str(self.remoteAddr))
+        # Received packets that have not been handled yet, in the
+        # order they arrived, from index head on, and the statistics
+        # of the last call to processIncomingUDP()
+        self.inbound = []
+        self.head = 0
+        self.receiveBudget = receiveBudget
+        self.maxReceivePackets = maxReceivePackets
+        self.maxBacklog = maxBacklog
+        self.handled = 0
+        self.deferred = 0
+        self.tickTime = 0.0
+
+        log('OSCEndpoint starting, local address ' + str(self.localAddr) + ' remote address ' + str(self.peers.values()))
         
         # Create our callback manager and register some utility
         # callbacks
         
         self.callbackManager = OSC.CallbackManager()
         self.callbackManager.add('/remix/echo', self.callbackEcho)
-        self.callbackManager.add('/remix/time', self.callbackEcho)
+        self.callbackManager.add('/remix/time', self.callbackTime)
         self.callbackManager.add('/remix/set_peer', self.setPeer)
+        self.callbackManager.add('/remix/add_peer', self.callbackAddPeer)
+        self.callbackManager.add('/remix/remove_peer', self.callbackRemovePeer)
+        self.callbackManager.add('/remix/subscribe', self.callbackSubscribe)
+        self.callbackManager.add('/remix/unsubscribe', self.callbackUnsubscribe)
+        self.callbackManager.add('/remix/stats', self.callbackStats)
+        self.callbackManager.add('/remix/resync', self.callbackResync)
  
     def send(self, address, msg):
        
         """
         Given an OSC address and OSC msg payload we construct our
-        OSC packet and send it to its destination. You can pass in lists
+        OSC packet and queue it for its destination, it is sent with
+        the next flush(). You can pass in lists
         or tuples in msg and we will iterate over them and append each 
         to the end of a single OSC packet.
         
@@ -136,17 +332,204 @@ class OSCEndpoint:
         combing through it yourself.
         """
         
-        oscMessage = OSC.OSCMessage(address, msg)
-        self.sendMessage(oscMessage)
+        peers = self.recipients(address)
+        if len(peers) == 0:
+            return
+        binary = OSC.OSCMessage(address, msg).getBinary()
+        for peer in peers:
+            peer.queue(binary)
+
+    def sendMessage(self, message, peers = None):
+        """
+        Queues an OSCMessage or the messages of an OSCBundle for the
+        next flush().  The messages of a bundle may be sent in more than
+        one datagram if they do not fit into one.  Each message is
+        encoded once and queued for all peers that subscribed to it, or
+        for the given peers.
+        """
+        if isinstance(message, OSC.OSCBundle):
+            items = message.items
+        else:
+            items = [message]
+        for item in items:
+            if peers == None:
+                recipients = self.recipients(item.address)
+            else:
+                recipients = peers
+            if len(recipients) > 0:
+                binary = item.getBinary()
+                for peer in recipients:
+                    peer.queue(binary)
+
+    def sendJournaled(self, address, msg, peers = None):
+        """
+        Queues a numbered state update for the peers that receive
+        address, or for the given peers, and adds it to their journals.
+        """
+        if peers == None:
+            peers = self.recipients(address)
+        if len(peers) == 0:
+            return
+        binary = OSC.OSCMessage(address, msg).getBinary()
+        for peer in peers:
+            peer.queueJournaled(binary, self.journalSize)
+
+    def recipients(self, address):
+        """
+        Returns the tuple of peers that receive messages sent to
+        address.  The result is cached until the peers or their
+        subscriptions change.
+        """
+        try:
+            return self.recipientCache[address]
+        except KeyError:
+            pass
+        peers = []
+        for peer in self.peers.values():
+            if peer.accepts(address):
+                peers.append(peer)
+        peers = tuple(peers)
+        if len(self.recipientCache) >= 1000:
+            self.recipientCache.clear()
+        self.recipientCache[address] = peers
+        return peers
+
+    def wants(self, address):
+        """
+        Returns true if any peer receives messages sent to address.
+        Listeners can use this to avoid reading values that nobody
+        receives.
+        """
+        return len(self.recipients(address)) > 0
+
+    def sendCoalesced(self, address, msg, keyLength = 0, journaled = 1, key = None):
+        """
+        Queues a state update for the next flush() instead of sending
+        it right away.  The update is identified by its address and
+        the first keyLength elements of msg (e.g. the track, device and
+        parameter numbers), or the tuple key if given.  If an update
+        with the same key is already queued, it is replaced, so that
+        only the latest value is sent, in the position of the first
+        update.
+
+        Unless journaled is false, which it should be for values that
+        change continuously like meters, the update is numbered and
+        kept in the journal of each peer, and its value is remembered
+        for the snapshot sent by /remix/resync.
+        """
+        if key == None and keyLength:
+            key = msg[:keyLength]
+        key = self.stateKey(address, key)
+        if journaled:
+            if not self.state.has_key(key):
+                self.stateKeys.append(key)
+            self.state[key] = (address, msg)
+        if len(self.recipients(address)) == 0:
+            return
+        if not self.pending.has_key(key):
+            self.pendingKeys.append(key)
+        self.pending[key] = (address, msg, journaled)
+
+    def stateKey(self, address, key):
+        if key:
+            return (address,) + tuple(key)
+        return address
+
+    def forgetState(self, address, key = ()):
+        """
+        Drops the last value of the state update identified by address
+        and the tuple key from the snapshot sent by /remix/resync, once
+        the object it describes no longer exists.
+        """
+        key = self.stateKey(address, key)
+        if self.state.has_key(key):
+            del self.state[key]
+            self.stateKeys.remove(key)
+
+    def forgetIndexedState(self):
+        """
+        Drops the last values of all state updates that are identified
+        by more than their address, e.g. by track and clip numbers,
+        from the snapshot sent by /remix/resync.  Called when the
+        numbering of the tracks or clips has changed.
+        """
+        self.stateKeys = [key for key in self.stateKeys if not isinstance(key, tuple)]
+        for key in self.state.keys():
+            if isinstance(key, tuple):
+                del self.state[key]
+
+    def flush(self):
+        """
+        Sends the messages queued since the last flush, including the
+        updates queued with sendCoalesced(), packed into as few
+        datagrams as possible.  This is called once per display update
+        and song time tick.
+        """
+        if len(self.pendingKeys) > 0:
+            pending = self.pending
+            keys = self.pendingKeys
+            self.pending = {}
+            self.pendingKeys = []
+            for key in keys:
+                address, msg, journaled = pending[key]
+                if journaled:
+                    self.sendJournaled(address, msg)
+                else:
+                    self.send(address, msg)
 
-    def sendMessage(self, message):
-        self.socket.sendto(message.getBinary(), self.remoteAddr)
+        for peer in self.peers.values():
+            if len(peer.outbound) == 0:
+                continue
+            outbound = peer.outbound
+            sequences = peer.sequences
+            peer.outbound = []
+            peer.sequences = []
+            try:
+                for datagram in packSequenced(outbound, sequences, self.maxPacketSize):
+                    self.socket.sendto(datagram, peer.addr)
+            except Exception, e:
+                log('error sending to peer ' + str(peer) + ': ' + str(e))
+
+    def addPeer(self, host, port):
+        """
+        Adds a peer that we send all messages to, returns the peer.
+        """
+        peer = OSCPeer(host, port)
+        if not self.peers.has_key(peer.addr):
+            self.peers[peer.addr] = peer
+            self.recipientCache.clear()
+        return self.peers[peer.addr]
+
+    def removePeer(self, host, port):
+        addr = (socket.gethostbyname(host), port)
+        if self.peers.has_key(addr):
+            del self.peers[addr]
+            self.recipientCache.clear()
+
+    def findPeers(self, msg, source, portIndex):
+        """
+        Returns the peers that a subscription message applies to: the
+        peer at the sender's address and the port given in
+        msg[portIndex] if there is such an argument, otherwise all peers
+        on the sender's host.
+        """
+        if len(msg) > portIndex:
+            addr = (source[0], msg[portIndex])
+            if self.peers.has_key(addr):
+                return [self.peers[addr]]
+            return []
+        peers = []
+        for peer in self.peers.values():
+            if peer.addr[0] == source[0]:
+                peers.append(peer)
+        return peers
 
     def processIncomingUDP(self):
         """
         This is the function that deals with incoming UDP messages.
-        It processes messages as long as any are buffered in the
-        socket, then returns.
+        It moves the packets buffered in the socket to the inbound
+        queue, then handles queued messages until the queue is empty
+        or the receiveBudget or maxReceivePackets is exhausted.
         
         There are several limitations to the Ableton Live Python environment. 
         
@@ -193,17 +576,55 @@ class OSCEndpoint:
           I haven't tested that at all yet. Since the window is 60ms, don't get 
           your hopes up about MIDI over OSC.
         """
+        start = time.time()
+        self.receive(start)
+
+        # Handle the queued packets in the order they arrived until
+        # the packet or time budget for this tick is used up.  The
+        # rest is handled on the next tick, so that a burst of
+        # packets does not block Live's user interface.
+        handled = 0
+        try:
+            while self.head < len(self.inbound) and handled < self.maxReceivePackets:
+                data, addr = self.inbound[self.head]
+                self.head = self.head + 1
+                handled = handled + 1
+                try:
+                    self.callbackManager.handle(data, addr)
+                except:
+                    self.send('/remix/error', (str(sys.exc_info())))
+                if time.time() - start >= self.receiveBudget:
+                    break
+        finally:
+            # Drop the handled packets at once, popping them one by
+            # one from the front of the list would copy the rest of
+            # the backlog every time
+            del self.inbound[:self.head]
+            self.head = 0
+
+        self.handled = handled
+        self.tickTime = time.time() - start
+
+    def receive(self, start):
+        """
+        Move the packets buffered in the socket to our inbound queue
+        until the queue is full or half the receiveBudget of the tick
+        that began at start is spent, leaving the other half for
+        handling them.  The packets that are left stay in the socket
+        until the next tick.
+        """
+        self.deferred = 0
         try:
             # Our socket is in non-blocking mode.  recvfrom will
             # either return the next packet waiting or raise an EAGAIN
             # exception that we catch to exit the reception loop.
             while 1:
-                self.data, self.addr = self.socket.recvfrom(65536)
-#                log('received packet from ' + str(self.addr))
-                try:
-                    self.callbackManager.handle(self.data, self.addr)
-                except:
-                    self.send('/remix/error', (str(sys.exc_info())))
+                if len(self.inbound) >= self.maxBacklog or time.time() - start >= self.receiveBudget / 2:
+                    self.deferred = 1
+                    break
+                packet = self.socket.recvfrom(65536)
+#                log('received packet from ' + str(packet[1]))
+                self.inbound.append(packet)
 
         except Exception, e:
             err, message=e
@@ -212,8 +633,9 @@ class OSCEndpoint:
 
     def shutdown(self):
         """
-        Close our socket.
+        Send what is still queued and close our socket.
         """
+        self.flush()
         self.socket.close()
 
     # standard callback handlers (in the /remix/ address name space)
@@ -231,8 +653,68 @@ class OSCEndpoint:
             host = source[0]
         port = msg[3]
         log('reconfigure to send to ' + host + ':' + str(port))
-        self.remoteAddr = (host, port)
+        self.peers = {}
+        self.addPeer(host, port)
+
+    def callbackAddPeer(self, msg, source):
+        """
+        Adds a peer that receives all messages that we send, in
+        addition to the existing ones.  The arguments are the same as
+        for /remix/set_peer.
+        """
+        host = msg[2]
+        if host == '':
+            host = source[0]
+        port = msg[3]
+        log('adding peer ' + host + ':' + str(port))
+        self.addPeer(host, port)
+
+    def callbackRemovePeer(self, msg, source):
+        """
+        Stops sending messages to the peer given as the argument, in
+        the same form as for /remix/set_peer.
+        """
+        host = msg[2]
+        if host == '':
+            host = source[0]
+        port = msg[3]
+        log('removing peer ' + host + ':' + str(port))
+        self.removePeer(host, port)
   
+    def callbackSubscribe(self, msg, source):
+        """
+        Subscribes the sending peer to the address prefix or OSC
+        address pattern given as first argument.  Peers initially
+        receive all messages.  Once a peer has subscribed to something,
+        it only receives the messages that match one of its
+        subscriptions, and its exclusions from /remix/unsubscribe are
+        dropped.  An empty prefix subscribes the peer to all messages
+        again.  The optional second argument is the peer's
+        port, needed if several peers run on one host.
+        """
+        prefix = msg[2]
+        for peer in self.findPeers(msg, source, 3):
+            if prefix == '':
+                peer.subscriptions = None
+                peer.exclusions = []
+            else:
+                peer.subscribe(prefix)
+            log('peer ' + str(peer) + ' subscriptions ' + str(peer.subscriptions) + ' exclusions ' + str(peer.exclusions))
+        self.recipientCache.clear()
+
+    def callbackUnsubscribe(self, msg, source):
+        """
+        Removes the subscription given as the first argument from the
+        sending peer, with the same arguments as /remix/subscribe.  If
+        the peer receives all messages, the messages matching the
+        argument are excluded instead.
+        """
+        prefix = msg[2]
+        for peer in self.findPeers(msg, source, 3):
+            peer.unsubscribe(prefix)
+            log('peer ' + str(peer) + ' subscriptions ' + str(peer.subscriptions) + ' exclusions ' + str(peer.exclusions))
+        self.recipientCache.clear()
+
     def callbackEcho(self, msg, source):
         """
         When re receive a '/remix/echo' OSC query from another host
@@ -242,6 +724,48 @@ class OSCEndpoint:
         
         self.send('/remix/echo', msg[2])
         
+    def callbackStats(self, msg, source):
+        """
+        When we receive a '/remix/stats' OSC query we respond with the
+        number of packets waiting to be handled, the number of packets
+        handled and the time in milliseconds spent in the last call
+        to processIncomingUDP(), and 1 if that call stopped reading
+        the socket early because the backlog was full or the time was
+        spent.
+        """
+
+        self.send('/remix/stats', (len(self.inbound) - self.head, self.handled, self.tickTime * 1000.0, self.deferred))
+
+    def callbackResync(self, msg, source):
+        """
+        When a peer receives a /remix/seq (first, last) message whose
+        first is not one more than the last sequence number it has seen,
+        it has lost state updates.  It then sends '/remix/resync' with
+        the last sequence number seen and, optionally, its port, and we
+        send it the updates it missed from its journal.  If they are not
+        in the journal anymore, we send the last value of every state
+        update instead.  Either way, we first respond with
+        '/remix/resync' (int first, int last, int snapshot), the range of
+        sequence numbers that follow and 1 if they are a snapshot.
+        """
+        for peer in self.findPeers(msg, source, 3):
+            entries = peer.journalSince(msg[2])
+            if entries != None:
+                if len(entries) > 0:
+                    peer.queue(OSC.OSCMessage('/remix/resync', (entries[0][0], entries[-1][0], 0)).getBinary())
+                    for seq, binary in entries:
+                        peer.queue(binary, seq)
+                continue
+
+            accepted = []
+            for key in self.stateKeys:
+                address, value = self.state[key]
+                if peer.accepts(address):
+                    accepted.append((address, value))
+            peer.queue(OSC.OSCMessage('/remix/resync', (peer.seq + 1, peer.seq + len(accepted), 1)).getBinary())
+            for address, value in accepted:
+                self.sendJournaled(address, value, (peer,))
+
     def callbackTime(self, msg, source):
         """
         When we receive a '/remix/time' OSC query from another host